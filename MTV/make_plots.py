@@ -1,8 +1,15 @@
 import subprocess
 import argparse
+import os
+import time
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-p2', '--phase2', action='store_true')
+parser.add_argument('-e', '--num_events', type=int, action='store', help='default: the one of the MTV config')
+parser.add_argument('-t', '--num_threads', type=int, action='store', help='per cmsRun, default: the one of the MTV config')
+parser.add_argument('-j', '--concurrency', type=int, action='store', help='cmsRun jobs at a time, default: all of them')
+parser.add_argument('-i', '--input_files', nargs='+', action='store', help='default: the full input of the phase')
+parser.add_argument('--parameters', default='../checkpoint/selected_params.csv', action='store')
 args = parser.parse_args()
 
 if args.phase2:
@@ -11,20 +18,55 @@ else:
     mtv_config = 'mtv.py'
 
 
-plot_cmd = ['makeTrackValidationPlots.py']
-for i in range(4):
-    dqm_output = 'dqm_output' + str(i) + '.root'
-    
-    subprocess.run(['cmsRun', mtv_config, 
-                    'dqmOutput=' + dqm_output,
-                    'index=' + str(i)])
-    if i == 0:
-        hist = 'default.root'
-    else:
-        hist = 'sample' + str(i) + '.root'
-    subprocess.run(['harvestTrackValidationPlots.py', dqm_output, '-o', hist])
-    plot_cmd.append(hist)
-subprocess.run(plot_cmd)
-
-        
-        
\ No newline at end of file
+# the default cuts followed by the points picked on the pareto front
+with open(args.parameters) as f:
+    num_selected = sum(1 for line in f if line.strip())
+
+def hist_file(i):
+    return 'default.root' if i == 0 else 'sample' + str(i) + '.root'
+
+# one MTV job per row of cuts, its log in mtv[i].log since the jobs run side by side
+def start_mtv(i):
+    command = ['cmsRun', mtv_config, 'parametersFile=' + args.parameters, 'dqmOutput=dqm_output' + str(i) + '.root',
+               'index=' + str(i)]
+    if args.num_events is not None:
+        command.append('nEvents=' + str(args.num_events))
+    if args.num_threads:
+        command.append('numThreads=' + str(args.num_threads))
+    for input_file in args.input_files or []:
+        command.append('inputFiles=' + (input_file if ':' in input_file else 'file:' + os.path.abspath(input_file)))
+    with open('mtv' + str(i) + '.log', 'w') as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+    process.start_time = time.time()
+    return process
+
+# at most --concurrency MTV jobs at a time, each harvested as soon as it is done while the others run
+concurrency = args.concurrency or num_selected
+pending = list(range(num_selected))
+running = {}
+harvesting = {}
+failed = []
+while pending or running:
+    while pending and len(running) < concurrency:
+        i = pending.pop(0)
+        running[i] = start_mtv(i)
+    time.sleep(1)
+    for i, process in list(running.items()):
+        if process.poll() is None:
+            continue
+        del running[i]
+        if process.returncode:
+            print('cmsRun %s index=%d exited with code %d, see mtv%d.log' % (mtv_config, i, process.returncode, i))
+            failed.append(i)
+            continue
+        print('cmsRun %s index=%d done in %.0f s' % (mtv_config, i, time.time() - process.start_time))
+        harvesting[i] = subprocess.Popen(['harvestTrackValidationPlots.py', 'dqm_output' + str(i) + '.root',
+                                          '-o', hist_file(i)])
+for i, process in harvesting.items():
+    if process.wait():
+        print('harvesting dqm_output%d.root exited with code %d' % (i, process.returncode))
+        failed.append(i)
+if failed:
+    raise SystemExit('no plots, failed: ' + ', '.join(str(i) for i in sorted(failed)))
+
+subprocess.run(['makeTrackValidationPlots.py'] + [hist_file(i) for i in range(num_selected)])
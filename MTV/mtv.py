@@ -5,6 +5,7 @@
 # with command line options: step3 -s RAW2DIGI:RawToDigi_pixelOnly,RECO:reconstruction_pixelTrackingOnly,VALIDATION:@pixelTrackingOnlyValidation,DQM:@pixelTrackingOnlyDQM --conditions auto:phase1_2022_realistic --datatier GEN-SIM-RECO,DQMIO -n 100 --eventcontent RECOSIM,DQM --geometry DB:Extended --era Run3 --procModifiers pixelNtupletFit,gpu --filein file:step2.root --fileout file:step3.root --nThreads 8
 import FWCore.ParameterSet.Config as cms
 import numpy as np
+import sys
 from Configuration.Eras.Era_Run3_cff import Run3
 from Configuration.ProcessModifiers.pixelNtupletFit_cff import pixelNtupletFit
 from Configuration.ProcessModifiers.gpu_cff import gpu
@@ -27,6 +28,11 @@ process.load('DQMOffline.Configuration.DQMOfflineMC_cff')
 process.load('Configuration.StandardSequences.FrontierConditions_GlobalTag_cff')
 
 
+# the cuts are named and typed by the search space of the optimization, run from the MTV folder
+sys.path.append('..')
+from config_builder import set_cuts
+from search_space import space
+
 # import VarParsing
 from FWCore.ParameterSet.VarParsing import VarParsing
 
@@ -45,6 +51,18 @@ options.register ('index',
                 VarParsing.varType.int,
                 "index")
 
+options.register ('nEvents',
+              1000,
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.int,
+              "Number of events")
+
+options.register ('numThreads',
+              8,
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.int,
+              "Number of threads")
+
 options.register ('dqmOutput',
               "dqm_ouput.root",
               VarParsing.multiplicity.singleton,
@@ -55,27 +73,16 @@ options.parseArguments()
 
 params = np.genfromtxt(options.parametersFile, delimiter=",", dtype=float)[int(options.index)]
 
-process.pixelTracksCUDA.CAThetaCutBarrel = cms.double(params[0])
-process.pixelTracksCUDA.CAThetaCutForward = cms.double(params[1])
-process.pixelTracksCUDA.dcaCutInnerTriplet = cms.double(params[2])
-process.pixelTracksCUDA.dcaCutOuterTriplet = cms.double(params[3])
-process.pixelTracksCUDA.hardCurvCut = cms.double(params[4])
-process.pixelTracksCUDA.z0Cut = cms.double(params[5])
-process.pixelTracksCUDA.phiCuts = cms.vint32(
-    int(params[6]), int(params[7]), int(params[8]), int(params[9]), int(params[10]),
-    int(params[11]), int(params[12]), int(params[13]), int(params[14]), int(params[15]),
-    int(params[16]), int(params[17]), int(params[18]), int(params[19]), int(params[20]),
-    int(params[21]), int(params[22]), int(params[23]), int(params[24])
-)
+set_cuts(process.pixelTracksCUDA, params, space(1))
 
 process.maxEvents = cms.untracked.PSet(
-    input = cms.untracked.int32(1000),
+    input = cms.untracked.int32(options.nEvents),
     output = cms.optional.untracked.allowed(cms.int32,cms.PSet)
 )
 
 # Input source
 process.source = cms.Source("PoolSource",
-    fileNames = cms.untracked.vstring('file:../input/step2.root'),
+    fileNames = cms.untracked.vstring(options.inputFiles or ['file:../input/step2.root']),
     secondaryFileNames = cms.untracked.vstring()
 )
 
@@ -113,7 +120,7 @@ process.options = cms.untracked.PSet(
 
 # Production Info
 process.configurationMetadata = cms.untracked.PSet(
-    annotation = cms.untracked.string('step3 nevts:1000'),
+    annotation = cms.untracked.string('step3 nevts:' + str(options.nEvents)),
     name = cms.untracked.string('Applications'),
     version = cms.untracked.string('$Revision: 1.19 $')
 )
@@ -161,7 +168,7 @@ from PhysicsTools.PatAlgos.tools.helpers import associatePatAlgosToolsTask
 associatePatAlgosToolsTask(process)
 
 #Setup FWK for multithreaded
-process.options.numberOfThreads = 8
+process.options.numberOfThreads = options.numThreads
 process.options.numberOfStreams = 0
 
 # customisation of the process.
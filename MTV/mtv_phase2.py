@@ -5,6 +5,7 @@
 # with command line options: step3 -s RAW2DIGI:RawToDigi_pixelOnly,RECO:reconstruction_pixelTrackingOnly,VALIDATION:@pixelTrackingOnlyValidation,DQM:@pixelTrackingOnlyDQM --conditions 131X_mcRun4_realistic_v2 --datatier DQMIO -n 10 --eventcontent DQM --geometry Extended2026D98 --era Phase2C17I13M9 --procModifiers pixelNtupletFit,gpu --filein file:step2_phase2.root --fileout file:step3.root --no_exec
 import FWCore.ParameterSet.Config as cms
 import numpy as np
+import sys
 
 from Configuration.Eras.Era_Phase2C17I13M9_cff import Phase2C17I13M9
 from Configuration.ProcessModifiers.pixelNtupletFit_cff import pixelNtupletFit
@@ -27,6 +28,11 @@ process.load('DQMServices.Core.DQMStoreNonLegacy_cff')
 process.load('DQMOffline.Configuration.DQMOfflineMC_cff')
 process.load('Configuration.StandardSequences.FrontierConditions_GlobalTag_cff')
 
+# the cuts are named and typed by the search space of the optimization, run from the MTV folder
+sys.path.append('..')
+from config_builder import set_cuts
+from search_space import space
+
 # import VarParsing
 from FWCore.ParameterSet.VarParsing import VarParsing
 
@@ -45,6 +51,18 @@ options.register ('index',
                 VarParsing.varType.int,
                 "index")
 
+options.register ('nEvents',
+              100,
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.int,
+              "Number of events")
+
+options.register ('numThreads',
+              10,
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.int,
+              "Number of threads")
+
 options.register ('dqmOutput',
               "dqm_ouput.root",
               VarParsing.multiplicity.singleton,
@@ -55,34 +73,16 @@ options.parseArguments()
 
 params = np.genfromtxt(options.parametersFile, delimiter=",", dtype=float)[int(options.index)]
 
-process.pixelTracksCUDA.CAThetaCutBarrel = cms.double(params[0])
-process.pixelTracksCUDA.CAThetaCutForward = cms.double(params[1])
-process.pixelTracksCUDA.dcaCutInnerTriplet = cms.double(params[2])
-process.pixelTracksCUDA.dcaCutOuterTriplet = cms.double(params[3])
-process.pixelTracksCUDA.hardCurvCut = cms.double(params[4])
-process.pixelTracksCUDA.z0Cut = cms.double(params[5])
-process.pixelTracksCUDA.phiCuts = cms.vint32(
-    int(params[6]), int(params[7]), int(params[8]), int(params[9]), int(params[10]),
-    int(params[11]), int(params[12]), int(params[13]), int(params[14]), int(params[15]),
-    int(params[16]), int(params[17]), int(params[18]), int(params[19]), int(params[20]),
-    int(params[21]), int(params[22]), int(params[23]), int(params[24]), int(params[25]),
-    int(params[26]), int(params[27]), int(params[28]), int(params[29]), int(params[30]),
-    int(params[31]), int(params[32]), int(params[33]), int(params[34]), int(params[35]),
-    int(params[36]), int(params[37]), int(params[38]), int(params[39]), int(params[40]),
-    int(params[41]), int(params[42]), int(params[43]), int(params[44]), int(params[45]),
-    int(params[46]), int(params[47]), int(params[48]), int(params[49]), int(params[50]),
-    int(params[51]), int(params[52]), int(params[53]), int(params[54]), int(params[55]),
-    int(params[56]), int(params[57]), int(params[58]), int(params[59]), int(params[60])
-)
+set_cuts(process.pixelTracksCUDA, params, space(2))
 
 process.maxEvents = cms.untracked.PSet(
-    input = cms.untracked.int32(100),
+    input = cms.untracked.int32(options.nEvents),
     output = cms.optional.untracked.allowed(cms.int32,cms.PSet)
 )
 
 # Input source
 process.source = cms.Source("PoolSource",
-    fileNames = cms.untracked.vstring('file:../input/step2_phase2.root'),
+    fileNames = cms.untracked.vstring(options.inputFiles or ['file:../input/step2_phase2.root']),
     secondaryFileNames = cms.untracked.vstring()
 )
 
@@ -120,7 +120,7 @@ process.options = cms.untracked.PSet(
 
 # Production Info
 process.configurationMetadata = cms.untracked.PSet(
-    annotation = cms.untracked.string('step3 nevts:100'),
+    annotation = cms.untracked.string('step3 nevts:' + str(options.nEvents)),
     name = cms.untracked.string('Applications'),
     version = cms.untracked.string('$Revision: 1.19 $')
 )
@@ -162,7 +162,7 @@ from PhysicsTools.PatAlgos.tools.helpers import associatePatAlgosToolsTask
 associatePatAlgosToolsTask(process)
 
 # customisation of the process.
-process.options.numberOfThreads = 10
+process.options.numberOfThreads = options.numThreads
 process.options.numberOfStreams = 0
 
 # Automatic addition of the customisation function from SimGeneral.MixingModule.fullMixCustomize_cff
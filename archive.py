@@ -0,0 +1,132 @@
+import argparse
+import bisect
+import numpy as np
+from search_space import space
+from utils import read_csv, write_csv
+
+# non-dominated archive for two objectives to be minimized, kept sorted by the first objective
+# (the second one is then strictly decreasing), so that an insertion is a binary search plus
+# the removal of the contiguous run of points it dominates.
+# With epsilon, dominance is decided on the epsilon grid and each box keeps one point;
+# with max_size, the most crowded points are dropped when the archive grows beyond it.
+class ParetoArchive:
+    def __init__(self, epsilon=None, max_size=None):
+        self.epsilon = epsilon
+        self.max_size = max_size
+        self.keys0 = []
+        self.keys1 = []
+        self.positions = []
+        self.fitness = []
+
+    def __len__(self):
+        return len(self.fitness)
+
+    def key(self, fitness):
+        if self.epsilon:
+            return tuple(np.floor(np.asarray(fitness, dtype=float) / self.epsilon).astype(int).tolist())
+        return float(fitness[0]), float(fitness[1])
+
+    # whether a point replaces the archived point with the same key
+    def replaces(self, fitness, archived):
+        if not self.epsilon:
+            return False
+        if fitness[0] <= archived[0] and fitness[1] <= archived[1]:
+            return True
+        if archived[0] <= fitness[0] and archived[1] <= fitness[1]:
+            return False
+        # neither dominates: keep the one closer to the corner of the box
+        corner = np.floor(np.asarray(fitness) / self.epsilon) * self.epsilon
+        return np.linalg.norm(np.asarray(fitness) - corner) < np.linalg.norm(np.asarray(archived) - corner)
+
+    # insert one point, return whether it entered the archive
+    def insert(self, position, fitness):
+        key0, key1 = self.key(fitness)
+        i = bisect.bisect_left(self.keys0, key0)
+        if i > 0 and self.keys1[i - 1] <= key1:
+            return False
+        if i < len(self) and self.keys0[i] == key0:
+            if self.keys1[i] < key1:
+                return False
+            if self.keys1[i] == key1 and not self.replaces(fitness, self.fitness[i]):
+                return False
+        j = i
+        while j < len(self) and self.keys1[j] >= key1:
+            j += 1
+        self.keys0[i:j] = [key0]
+        self.keys1[i:j] = [key1]
+        self.positions[i:j] = [np.array(position, dtype=float)]
+        self.fitness[i:j] = [np.array(fitness, dtype=float)]
+        if self.max_size and len(self) > self.max_size:
+            self.remove_most_crowded()
+        return True
+
+    # drop the interior point with the smallest crowding distance
+    def remove_most_crowded(self):
+        fitness = np.array(self.fitness)
+        span = np.maximum(fitness.max(axis=0) - fitness.min(axis=0), 1e-12)
+        crowding = np.sum(np.abs(fitness[2:] - fitness[:-2]) / span, axis=1)
+        i = int(np.argmin(crowding)) + 1 if len(crowding) else len(self) - 1
+        for values in (self.keys0, self.keys1, self.positions, self.fitness):
+            del values[i]
+
+    def insert_many(self, positions, fitness):
+        for position, values in zip(positions, fitness):
+            self.insert(position, values)
+
+    # merge the points of another archive or of a front file matrix: its first num_params columns are the
+    # positions and the next two efficiency and fake rate, whatever objectives follow (the CA time of
+    # pareto_front_cuts.csv with --time_objective)
+    def merge(self, other, num_params=None):
+        if isinstance(other, ParetoArchive):
+            self.insert_many(other.positions, other.fitness)
+        else:
+            other = np.asarray(other, dtype=float)
+            if not other.size:
+                return
+            if num_params is None or other.shape[1] < num_params + 2:
+                raise ValueError('a front with %d columns cannot hold %s cuts and two objectives' % (other.shape[1], num_params))
+            self.insert_many(other[:, :num_params], other[:, num_params:num_params + 2])
+
+    # one row per point: the cuts followed by the two objectives, sorted by the first objective
+    def to_matrix(self):
+        if not len(self):
+            return np.empty((0, 0))
+        return np.hstack([np.array(self.positions), np.array(self.fitness)])
+
+    # num evenly spaced points along the front, ends excluded
+    def select(self, num):
+        indices = np.linspace(0, len(self) - 1, num + 2)[1:-1].round().astype(int)
+        return self.to_matrix()[indices]
+
+    def save(self, filename):
+        write_csv(filename, self.to_matrix())
+
+    @classmethod
+    def from_csv(cls, filenames, num_params, epsilon=None, max_size=None):
+        archive = cls(epsilon=epsilon, max_size=max_size)
+        for filename in [filenames] if isinstance(filenames, str) else filenames:
+            archive.merge(read_csv(filename), num_params)
+        return archive
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['merge', 'select'])
+    parser.add_argument('fronts', nargs='+')
+    parser.add_argument('-p2', '--phase2', action='store_true')
+    parser.add_argument('-o', '--output', required=True, action='store')
+    parser.add_argument('--epsilon', type=float, action='store')
+    parser.add_argument('--max_size', type=int, action='store')
+    parser.add_argument('-n', '--num_points', default=3, type=int, action='store')
+    parser.add_argument('--default', default='checkpoint/default.csv', action='store')
+    args = parser.parse_args()
+
+    # files with the cuts of the phase (archive.csv, pareto_front_cuts.csv), not MOPSO's pareto_front.csv
+    num_params = len(space(2 if args.phase2 else 1))
+    archive = ParetoArchive.from_csv(args.fronts, num_params, epsilon=args.epsilon, max_size=args.max_size)
+    print(len(archive), 'points on the merged front')
+    if args.command == 'merge':
+        archive.save(args.output)
+    else:
+        # the MTV input: the default cuts first, then the selected points, cuts only
+        selected = archive.select(args.num_points)
+        write_csv(args.output, np.vstack([read_csv(args.default)[:, :num_params], selected[:, :num_params]]))
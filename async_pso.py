@@ -0,0 +1,118 @@
+import os
+import time
+import numpy as np
+from executor import PENALTY
+from utils import compute_metrics_batch, effective_params, split_times
+
+# steady-state MOPSO: a fixed number of evaluation slots is kept busy, and as soon as one
+# finishes, the personal bests and the archive are updated and its particles move on,
+# without waiting for the slowest cmsRun of a generation; the particles move in the coordinates
+# of the search space, the archive keeps the cuts
+class AsyncMOPSO:
+    def __init__(self, executor, archive, search_space, num_particles, num_events, num_slots=4,
+                 slot_batch=10, inertia_weight=0.5, cognitive_coefficient=1, social_coefficient=1, cache=None):
+        self.executor = executor
+        self.archive = archive
+        self.search_space = search_space
+        self.lower_bounds = np.asarray(search_space.lower_bounds, dtype=float)
+        self.upper_bounds = np.asarray(search_space.upper_bounds, dtype=float)
+        self.num_events = num_events
+        self.num_slots = num_slots
+        self.slot_batch = slot_batch
+        self.inertia_weight = inertia_weight
+        self.cognitive_coefficient = cognitive_coefficient
+        self.social_coefficient = social_coefficient
+        self.cache = cache
+        self.positions = np.random.uniform(self.lower_bounds, self.upper_bounds, (num_particles, len(self.lower_bounds)))
+        self.velocities = np.zeros_like(self.positions)
+        self.best_positions = self.positions.copy()
+        self.best_fitness = np.full((num_particles, 2), np.inf)
+        self.generations = np.zeros(num_particles, dtype=int)
+        self.evaluations = 0
+
+    # new personal best when it dominates the old one, or half of the time when neither dominates
+    def update_best(self, particle, fitness):
+        best = self.best_fitness[particle]
+        if np.all(best <= fitness) and np.any(best < fitness):
+            return
+        if np.all(fitness <= best) or np.random.rand() < 0.5:
+            self.best_fitness[particle] = fitness
+            self.best_positions[particle] = self.positions[particle]
+
+    # move a particle towards its personal best and a random leader of the archive
+    def move(self, particle):
+        leader = self.search_space.from_params(self.archive.positions[np.random.randint(len(self.archive))])[0] \
+            if len(self.archive) else self.best_positions[particle]
+        r1, r2 = np.random.rand(2, len(self.lower_bounds))
+        velocity = (self.inertia_weight * self.velocities[particle]
+                    + self.cognitive_coefficient * r1 * (self.best_positions[particle] - self.positions[particle])
+                    + self.social_coefficient * r2 * (leader - self.positions[particle]))
+        position = np.clip(self.positions[particle] + velocity, self.lower_bounds, self.upper_bounds)
+        velocity[position != self.positions[particle] + velocity] = 0
+        self.velocities[particle] = velocity
+        self.positions[particle] = position
+
+    # a particle's evaluation is done: update its best, the archive, and move it
+    def finish(self, particle, counters, on_result):
+        fitness = compute_metrics_batch([counters])[0]
+        row = self.search_space.to_params(self.positions[particle])[0]
+        self.update_best(particle, fitness)
+        self.archive.insert(row, fitness)
+        if on_result is not None:
+            on_result(self.generations[particle], particle, row, fitness, split_times([counters])[1][0])
+        self.generations[particle] += 1
+        self.evaluations += 1
+        self.move(particle)
+
+    # start the given particles in a slot, answering cached and quarantined rows right away;
+    # return the job (None if everything was cached) and the particles answered from the cache
+    def dispatch(self, particles, slot, on_result):
+        rows = [effective_params(row, self.search_space)
+                for row in self.search_space.to_params(self.positions[particles])]
+        quarantined = [row in self.executor.quarantine for row in rows]
+        cached = [particle for particle, bad in zip(particles, quarantined) if bad]
+        for particle in cached:
+            self.finish(particle, PENALTY, on_result)
+        rows = [row for row, bad in zip(rows, quarantined) if not bad]
+        particles = [particle for particle, bad in zip(particles, quarantined) if not bad]
+        if self.cache is not None:
+            keys = [self.cache.key(row, self.num_events) for row in rows]
+            found = self.cache.get(keys)
+            cached += [particle for particle, key in zip(particles, keys) if key in found]
+            for particle, key in zip(particles, keys):
+                if key in found:
+                    self.finish(particle, found[key], on_result)
+            rows = [row for row, key in zip(rows, keys) if key not in found]
+            particles = [particle for particle, key in zip(particles, keys) if key not in found]
+        if not particles:
+            return None, cached
+        directory = os.path.join(self.executor.work_dir, 'slot' + str(slot))
+        return (self.executor.start(rows, directory, self.num_events), directory, particles, rows), cached
+
+    # run until max_evaluations particles have been evaluated (the slots still running at that
+    # point are collected too), return the throughput in evaluations per hour
+    def optimize(self, max_evaluations, on_result=None):
+        start_time = time.time()
+        waiting = list(range(len(self.positions)))
+        running = {}
+        while self.evaluations < max_evaluations or running:
+            for slot in range(self.num_slots):
+                while slot not in running and waiting and self.evaluations < max_evaluations:
+                    particles, waiting = waiting[:self.slot_batch], waiting[self.slot_batch:]
+                    job, cached = self.dispatch(particles, slot, on_result)
+                    waiting += cached
+                    if job is not None:
+                        running[slot] = job
+            time.sleep(0.05)
+            for slot, (process, directory, particles, rows) in list(running.items()):
+                if process.poll() is None:
+                    continue
+                del running[slot]
+                self.executor.finished(process, directory)
+                counters = self.executor.result(process, directory, rows, self.num_events)
+                if self.cache is not None:
+                    self.cache.put([self.cache.key(row, self.num_events) for row in rows], rows, counters)
+                for particle, values in zip(particles, counters):
+                    self.finish(particle, values, on_result)
+                    waiting.append(particle)
+        return self.evaluations / (time.time() - start_time) * 3600
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import numpy as np
+from memory import PeakMonitor
+from timing import read_trace
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+# metrics compared against a baseline, with whether a larger value is better
+METRICS = {'evaluations_per_second': True, 'overhead_per_iteration': False, 'mopso_per_iteration': False,
+           'setup_seconds': False, 'peak_rss_mb': False}
+
+# a folder where optimize.py runs against stand_in.py: the sources linked, empty input files,
+# and a cmsRun on the PATH that is the stand-in
+def prepare(work_dir):
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
+    os.makedirs(os.path.join(work_dir, 'input'))
+    os.makedirs(os.path.join(work_dir, 'bin'))
+    for name in os.listdir(REPO):
+        if name.endswith('.py'):
+            os.symlink(os.path.join(REPO, name), os.path.join(work_dir, name))
+    for name in ('step2.root', 'step2_phase2.root'):
+        open(os.path.join(work_dir, 'input', name), 'w').close()
+    cmsrun = os.path.join(work_dir, 'bin', 'cmsRun')
+    with open(cmsrun, 'w') as f:
+        f.write('#!/bin/sh\nexec %s %s "$@"\n' % (sys.executable, os.path.join(REPO, 'stand_in.py')))
+    os.chmod(cmsrun, 0o755)
+
+# run optimize.py once and measure its throughput, the time it spends outside cmsRun and its own peak memory
+def run_case(work_dir, phase, num_particles, num_iterations, num_events, extra):
+    prepare(work_dir)
+    env = dict(os.environ, PATH=os.path.join(os.path.abspath(work_dir), 'bin') + os.pathsep + os.environ['PATH'])
+    command = [sys.executable, 'optimize.py', '-p', str(num_particles), '-i', str(num_iterations),
+               '-e', str(num_events)] + (['-p2'] if phase == 2 else []) + extra
+    log_file = os.path.join(work_dir, 'optimize.log')
+    start = time.time()
+    with open(log_file, 'w') as log:
+        process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    monitor = PeakMonitor(process, interval=0.05, children=False)
+    process.wait()
+    wall = time.time() - start
+    peak = monitor.stop()
+    if process.returncode:
+        raise RuntimeError('optimize.py failed, see ' + log_file)
+    records = read_trace(os.path.join(work_dir, 'history', 'trace.jsonl'))
+    iterations = {record['iteration']: record['seconds'] for record in records if record['stage'] == 'iteration'}
+    evaluations = {}
+    for record in records:
+        if record['stage'] == 'evaluate':
+            evaluations[record['iteration']] = evaluations.get(record['iteration'], 0) + record['seconds']
+    mopso = [record['seconds'] for record in records if record['stage'] == 'mopso']
+    return {'phase': phase, 'num_particles': num_particles, 'num_iterations': num_iterations,
+            'num_events': num_events, 'wall_seconds': wall,
+            'evaluations_per_second': num_particles * num_iterations / wall,
+            'iteration_seconds': float(np.mean(list(iterations.values()))),
+            'evaluate_per_iteration': float(np.mean([evaluations.get(i, 0) for i in iterations])),
+            'overhead_per_iteration': float(np.mean([seconds - evaluations.get(i, 0)
+                                                     for i, seconds in iterations.items()])),
+            'mopso_per_iteration': float(np.mean(mopso)) if mopso else 0.0,
+            'setup_seconds': wall - sum(iterations.values()) - sum(mopso),
+            'peak_rss_mb': peak / 1e6}
+
+def machine():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpus': os.cpu_count(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+def print_results(results):
+    print('%5s %6s %10s %12s %14s %14s %12s %10s %10s' % ('phase', 'N', 'wall [s]', 'eval/s', 'evaluate/it [s]',
+                                                          'overhead/it [s]', 'mopso/it [s]', 'setup [s]', 'RSS [MB]'))
+    for result in results:
+        print('%5d %6d %10.2f %12.1f %14.3f %14.3f %12.3f %10.2f %10.1f'
+              % (result['phase'], result['num_particles'], result['wall_seconds'], result['evaluations_per_second'],
+                 result['evaluate_per_iteration'], result['overhead_per_iteration'], result['mopso_per_iteration'],
+                 result['setup_seconds'], result['peak_rss_mb']))
+
+# relative change of every metric against the baseline run with the same phase and population;
+# return the regressions beyond the tolerance
+def compare(results, baseline, tolerance):
+    reference = {(result['phase'], result['num_particles']): result for result in baseline['results']}
+    regressions = []
+    print('%5s %6s %-24s %12s %12s %8s' % ('phase', 'N', 'metric', 'baseline', 'now', 'change'))
+    for result in results:
+        key = (result['phase'], result['num_particles'])
+        if key not in reference:
+            continue
+        for metric, larger_is_better in METRICS.items():
+            old, new = reference[key][metric], result[metric]
+            change = (new - old) / old if old else 0.0
+            worse = -change if larger_is_better else change
+            flag = ' REGRESSION' if worse > tolerance else ''
+            if flag:
+                regressions.append((key, metric))
+            print('%5d %6d %-24s %12.4g %12.4g %+7.0f%%%s' % (*key, metric, old, new, 100 * change, flag))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='+', default=[50, 200, 500, 1000, 2000], type=int)
+    parser.add_argument('--phases', nargs='+', default=[1, 2], type=int, choices=[1, 2])
+    parser.add_argument('-i', '--num_iterations', default=3, type=int, action='store')
+    parser.add_argument('-e', '--num_events', default=10, type=int, action='store')
+    parser.add_argument('--extra', default='', action='store', help='more options of optimize.py, e.g. "-s 4 --surrogate 0.3"')
+    parser.add_argument('--work_dir', default='temp/benchmark', action='store')
+    parser.add_argument('-o', '--output', default='benchmarks/baseline.json', action='store')
+    parser.add_argument('--compare', action='store', help='baseline to compare with (exit code 1 on a regression)')
+    parser.add_argument('--tolerance', default=0.2, type=float, action='store')
+    args = parser.parse_args()
+
+    # read before the output is written, which may be the same file
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = []
+    for phase in args.phases:
+        for num_particles in args.sizes:
+            print('phase %d, %d particles' % (phase, num_particles))
+            results.append(run_case(os.path.join(args.work_dir, 'phase%d_%d' % (phase, num_particles)), phase,
+                                    num_particles, args.num_iterations, args.num_events, args.extra.split()))
+    print_results(results)
+    directory = os.path.dirname(args.output)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(args.output, 'w') as f:
+        json.dump({'machine': machine(), 'settings': vars(args), 'environment': {name: value for name, value in
+                   os.environ.items() if name.startswith('STAND_IN_')}, 'results': results}, f, indent=4)
+    print('results written to', args.output)
+    if baseline is not None and compare(results, baseline, args.tolerance):
+        raise SystemExit(1)
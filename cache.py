@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sqlite3
+import numpy as np
+from utils import split_times
+
+# sources the reconstruction configs build the particle modules and set the cuts with, besides the config itself
+SOURCES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in ('config_builder.py', 'search_space.py')]
+
+# on-disk store of validation counters and CA time, keyed by the effective cuts and everything else that affects them;
+# the counters do not depend on how the jobs were run, the time does (threads per cmsRun, concurrent cmsRuns,
+# executor): it is stored with that timing setup and only served to runs with the same one
+class EvaluationCache:
+    def __init__(self, filename, config, input_file, num_events, backend='cmssw', event_list=None, timing_setup=None):
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS evaluations '
+                                '(key TEXT PRIMARY KEY, params TEXT, rt REAL, at REAL, ast REAL, dt REAL, st REAL, time REAL)')
+        # caches written before the time was recorded: their rows get a NULL time
+        columns = [column[1] for column in self.connection.execute('PRAGMA table_info(evaluations)')]
+        if 'time' not in columns:
+            self.connection.execute('ALTER TABLE evaluations ADD COLUMN time REAL')
+        # and before the timing setup was: their times are never served
+        if 'setup' not in columns:
+            self.connection.execute('ALTER TABLE evaluations ADD COLUMN setup TEXT')
+        self.connection.commit()
+        self.context = {'config': config, 'config_hash': file_hash(config), 'input_file': input_file,
+                        'input_stat': file_stat(input_file), 'num_events': num_events,
+                        'sources_hash': sources_hash()}
+        # the events are chosen by the list rather than taken from the start of the file
+        if event_list:
+            self.context['event_list'] = file_hash(event_list)
+        # results of stand-in backends must never be served to real runs
+        if backend != 'cmssw':
+            self.context['backend'] = backend
+        self.setup = json.dumps(timing_setup or {}, sort_keys=True)
+        self.hits = 0
+        self.misses = 0
+
+    # hash of one row of effective cuts together with the evaluation context
+    def key(self, row, num_events=None):
+        context = dict(self.context)
+        if num_events is not None:
+            context['num_events'] = num_events
+        text = json.dumps({'params': [repr(value) for value in row], **context}, sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    # return a dict of the cached counters followed by the time (NaN when unknown or measured with another timing
+    # setup) for the keys that are present; with needs_time, rows without such a time count as missing
+    def get(self, keys, needs_time=False):
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), 500):
+            chunk = unique_keys[start:start + 500]
+            query = ('SELECT key, rt, at, ast, dt, st, time, setup FROM evaluations WHERE key IN (%s)'
+                     % ','.join('?' * len(chunk)))
+            for key, *counters, time, setup in self.connection.execute(query, chunk):
+                if setup != self.setup:
+                    time = None
+                if time is not None or not needs_time:
+                    found[key] = counters + [float('nan') if time is None else time]
+        self.hits += len(found)
+        self.misses += len(unique_keys) - len(found)
+        return found
+
+    # store the counters and time of freshly evaluated rows (a NaN time is stored as NULL);
+    # rows that failed (infinite time) are left out, the quarantine keeps track of them
+    def put(self, keys, rows, counters):
+        counters, times = split_times(counters)
+        self.connection.executemany('INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                    [(key, json.dumps(list(row)), *[float(value) for value in values],
+                                      None if np.isnan(time) else float(time), self.setup)
+                                     for key, row, values, time in zip(keys, rows, counters, times)
+                                     if not np.isinf(time)])
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+# hash of a file's contents, so that editing a config invalidates its entries
+def file_hash(filename):
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# hash of the module templates and of the search space, the same as the one of the cached particle modules
+def sources_hash():
+    digest = hashlib.sha256()
+    for filename in SOURCES:
+        with open(filename, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# size and modification time of a file, cheaper than hashing a large input
+def file_stat(filename):
+    if not os.path.exists(filename):
+        return None
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
@@ -0,0 +1,64 @@
+import argparse
+import os
+import shutil
+import subprocess
+import numpy as np
+from executor import ShardedExecutor
+from search_space import space
+from timing import Tracer, read_trace
+from utils import effective_params, split_times
+
+# run the reconstruction config of a phase with the default cuts on the full input and on its pixel-only skim,
+# and check that the validation counters are identical while the skim is smaller and faster to read
+def check(phase, num_events, num_threads, make_skim):
+    config = 'reconstruction_phase2.py' if phase == 2 else 'reconstruction.py'
+    input_file = 'input/step2_phase2.root' if phase == 2 else 'input/step2.root'
+    skim_file = input_file.replace('.root', '_skim.root')
+    if not os.path.exists(skim_file):
+        if not make_skim:
+            raise FileNotFoundError(skim_file + ' is missing, run input/skim.py or pass --make_skim')
+        subprocess.run(['cmsRun', 'input/skim.py', 'inputFiles=file:' + input_file, 'outputFile=' + skim_file]
+                       + (['phase2=True'] if phase == 2 else []), check=True)
+    search_space = space(phase)
+    rows = [effective_params(search_space.defaults, search_space)]
+    results = {}
+    failed = []
+    for label, filename in (('full', input_file), ('skim', skim_file)):
+        work_dir = os.path.join('temp', 'check_skim', label)
+        if os.path.exists(work_dir):
+            shutil.rmtree(work_dir)
+        tracer = Tracer(os.path.join(work_dir, 'trace.jsonl'))
+        executor = ShardedExecutor(config, filename, num_events, num_threads=num_threads, work_dir=work_dir,
+                                   tracer=tracer)
+        counters, times = split_times(executor.evaluate(rows, num_events))
+        counters = counters[0]
+        tracer.close()
+        # a cmsRun that failed gives the penalty, which would compare equal on both inputs
+        if len(executor.quarantine) or np.isinf(times).any():
+            failed.append(label)
+        stages = {record['stage']: record['seconds'] for record in read_trace(os.path.join(work_dir, 'trace.jsonl'))}
+        results[label] = (counters, os.path.getsize(filename), stages)
+    print('%-6s %12s %12s %14s %12s  %s' % ('input', 'size [MB]', 'cmsRun [s]', 'event loop [s]', 'startup [s]',
+                                             'counters (rt, at, ast, dt, st)'))
+    for label, (counters, size, stages) in results.items():
+        print('%-6s %12.1f %12.2f %14.2f %12.2f  %s' % (label, size / 1e6, stages.get('cmsrun', np.nan),
+                                                         stages.get('event_loop', np.nan), stages.get('startup', np.nan),
+                                                         ' '.join('%d' % value for value in counters)))
+    if failed:
+        print('%s: cmsRun failed on the %s input, see %s' % (config, ' and '.join(failed),
+                                                           os.path.join('temp', 'check_skim', failed[0], 'shard0')))
+        return False
+    same = np.array_equal(results['full'][0], results['skim'][0])
+    print('%s: the counters on the skim are %s' % (config, 'identical' if same else 'DIFFERENT'))
+    return same
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p2', '--phase2', action='store_true')
+    parser.add_argument('-e', '--num_events', default=100, type=int, action='store')
+    parser.add_argument('-t', '--num_threads', type=int, action='store')
+    parser.add_argument('--make_skim', action='store_true')
+    args = parser.parse_args()
+
+    if not check(2 if args.phase2 else 1, args.num_events, args.num_threads, args.make_skim):
+        raise SystemExit(1)
@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import os
+import pickle
+import time
+import uuid
+import FWCore.ParameterSet.Config as cms
+from FWCore.ParameterSet.SequenceTypes import _SequenceCollection
+from search_space import space
+
+# parameters of the CA that differ between Phase-1 and Phase-2
+def phase_parameters(phase):
+    if phase == 1:
+        return dict(
+            idealConditions = cms.bool(True),
+            includeJumpingForwardDoublets = cms.bool(False),
+            maxNumberOfDoublets = cms.uint32(524288),
+            ptCut = cms.double(0.5),
+            trackQualityCuts = cms.PSet(
+                chi2Coeff = cms.vdouble(0.9, 1.8),
+                chi2MaxPt = cms.double(10),
+                chi2Scale = cms.double(8),
+                quadrupletMaxTip = cms.double(0.5),
+                quadrupletMaxZip = cms.double(12),
+                quadrupletMinPt = cms.double(0.3),
+                tripletMaxTip = cms.double(0.3),
+                tripletMaxZip = cms.double(12),
+                tripletMinPt = cms.double(0.5)
+            )
+        )
+    return dict(
+        idealConditions = cms.bool(False),
+        includeFarForwards = cms.bool(True),
+        includeJumpingForwardDoublets = cms.bool(True),
+        maxNumberOfDoublets = cms.uint32(2621440),
+        ptCut = cms.double(0.8500000238418579),
+        trackQualityCuts = cms.PSet(
+            maxChi2 = cms.double(5),
+            minPt = cms.double(0.5),
+            maxTip = cms.double(0.3),
+            maxZip = cms.double(12)
+        )
+    )
+
+# the four modules of one particle, defined once per phase; the cuts and the labels
+# of the particle's own products are filled in when they are cloned
+def templates(phase):
+    ca = cms.EDProducer('CAHitNtupletCUDAPhase' + str(phase),
+        CAThetaCutBarrel = cms.double(0),
+        CAThetaCutForward = cms.double(0),
+        dcaCutInnerTriplet = cms.double(0),
+        dcaCutOuterTriplet = cms.double(0),
+        hardCurvCut = cms.double(0),
+        z0Cut = cms.double(0),
+        phiCuts = cms.vint32(),
+        doClusterCut = cms.bool(True),
+        doPtCut = cms.bool(True),
+        doSharedHitCut = cms.bool(True),
+        doZ0Cut = cms.bool(True),
+        dupPassThrough = cms.bool(False),
+        earlyFishbone = cms.bool(True),
+        fillStatistics = cms.bool(False),
+        fitNas4 = cms.bool(False),
+        lateFishbone = cms.bool(False),
+        mightGet = cms.optional.untracked.vstring,
+        minHitsForSharingCut = cms.uint32(10),
+        minHitsPerNtuplet = cms.uint32(4),
+        onGPU = cms.bool(True),
+        pixelRecHitSrc = cms.InputTag('siPixelRecHitsPreSplittingCUDA'),
+        ptmin = cms.double(0.8999999761581421),
+        useRiemannFit = cms.bool(False),
+        useSimpleTripletCleaner = cms.bool(True),
+        **phase_parameters(phase)
+    )
+    soa = cms.EDProducer('PixelTrackSoAFromCUDAPhase' + str(phase),
+        mightGet = cms.optional.untracked.vstring,
+        src = cms.InputTag('pixelTracksCUDA')
+    )
+    tracks = cms.EDProducer('PixelTrackProducerFromSoAPhase' + str(phase),
+        beamSpot = cms.InputTag('offlineBeamSpot'),
+        mightGet = cms.optional.untracked.vstring,
+        minNumberOfHits = cms.int32(0),
+        minQuality = cms.string('loose'),
+        pixelRecHitLegacySrc = cms.InputTag('siPixelRecHitsPreSplitting'),
+        trackSrc = cms.InputTag('pixelTracksSoA')
+    )
+    validation = cms.EDAnalyzer('SimpleValidation',
+        chargedOnlyTP = cms.bool(True),
+        intimeOnlyTP = cms.bool(False),
+        invertRapidityCutTP = cms.bool(False),
+        lipTP = cms.double(30.0),
+        maxPhi = cms.double(3.2),
+        maxRapidityTP = cms.double(2.5),
+        minHitTP = cms.int32(0),
+        minPhi = cms.double(-3.2),
+        minRapidityTP = cms.double(-2.5),
+        pdgIdTP = cms.vint32(),
+        ptMaxTP = cms.double(1e+100),
+        ptMinTP = cms.double(0.9),
+        signalOnlyTP = cms.bool(True),
+        stableOnlyTP = cms.bool(False),
+        tipTP = cms.double(3.5),
+        trackLabels = cms.VInputTag('pixelTracks'),
+        trackAssociator = cms.untracked.InputTag('quickTrackAssociatorByHits'),
+        trackingParticles = cms.InputTag('mix', 'MergedTrackTruth')
+    )
+    return ca, soa, tracks, validation
+
+# the modules of num_particles particles, cloned from the templates with only the labels changed
+def clone_modules(phase, num_particles):
+    ca, soa, tracks, validation = templates(phase)
+    return [(ca.clone(),
+             soa.clone(src = cms.InputTag('pixelTracksCUDA' + str(i))),
+             tracks.clone(trackSrc = cms.InputTag('pixelTracksSoA' + str(i))),
+             validation.clone(trackLabels = cms.VInputTag('pixelTracks' + str(i))))
+            for i in range(num_particles)]
+
+# hash of this file and of the search space, so that editing the templates or the types of the cuts
+# invalidates the cached modules
+def source_hash():
+    digest = hashlib.sha256()
+    for name in ('config_builder.py', 'search_space.py'):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# the modules of num_particles particles from a pickle written the first time this number is seen,
+# which is faster to load than to clone them again (cloned every time without a cache_dir)
+def particle_modules(phase, num_particles, cache_dir=None):
+    if not cache_dir:
+        return clone_modules(phase, num_particles)
+    cache_file = os.path.join(cache_dir, 'phase%d_%d_%s.pkl' % (phase, num_particles, source_hash()))
+    if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    modules = clone_modules(phase, num_particles)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    # concurrent shards may write the same file
+    temp_file = cache_file + '.' + uuid.uuid4().hex
+    with open(temp_file, 'wb') as f:
+        pickle.dump(modules, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, cache_file)
+    return modules
+
+# set the cuts of one row of parameters.csv on a CA module, named and typed by the search space of the phase
+def set_cuts(ca, row, search_space):
+    for name, value in search_space.parameter_values(row).items():
+        setattr(ca, name, cms.vint32(*value) if isinstance(value, list) else cms.double(value))
+
+# add the modules of every particle to the process with their cuts, the task running the CA and the
+# conversions, and the sequence of the validations, built in one go rather than by repeated addition
+def add_particles(process, params, phase, cache_dir=None):
+    modules = particle_modules(phase, len(params), cache_dir)
+    search_space = space(phase)
+    for i, (row, (ca, soa, tracks, validation)) in enumerate(zip(params, modules)):
+        set_cuts(ca, row, search_space)
+        setattr(process, 'pixelTracksCUDA' + str(i), ca)
+        setattr(process, 'pixelTracksSoA' + str(i), soa)
+        setattr(process, 'pixelTracks' + str(i), tracks)
+        setattr(process, 'simpleValidation' + str(i), validation)
+    process.pixelTracksTask = cms.Task(*[module for particle in modules for module in particle[:3]])
+    process.pixelTracksSeq = cms.Sequence(process.pixelTracksTask)
+    if modules:
+        process.simpleValSeq = cms.Sequence(_SequenceCollection(*[particle[3] for particle in modules]))
+
+# build time of the particle modules against the number of particles
+def benchmark(phase, sizes, repeat, cache_dir):
+    print('%8s %12s %12s %12s' % ('N', 'clone [s]', 'cached [s]', 'process [s]'))
+    for num_particles in sizes:
+        params = [space(phase).defaults] * num_particles
+        timings = []
+        for build in (lambda: clone_modules(phase, num_particles),
+                      lambda: particle_modules(phase, num_particles, cache_dir),
+                      lambda: add_particles(cms.Process('BENCHMARK'), params, phase, cache_dir)):
+            # the first cached build writes the pickle, it is not timed
+            build()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                build()
+            timings.append((time.perf_counter() - start) / repeat)
+        print('%8d %12.4f %12.4f %12.4f' % (num_particles, *timings))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['benchmark'])
+    parser.add_argument('-p2', '--phase2', action='store_true')
+    parser.add_argument('-n', '--num_particles', nargs='+', default=[10, 100, 200, 500, 1000], type=int)
+    parser.add_argument('-r', '--repeat', default=3, type=int, action='store')
+    parser.add_argument('--cache_dir', default='cache/config', action='store')
+    args = parser.parse_args()
+
+    benchmark(2 if args.phase2 else 1, args.num_particles, args.repeat, args.cache_dir)
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import runpy
+import sys
+import time
+import numpy as np
+import uproot
+from stand_in import analytic_counters
+from utils import get_counters_batch, get_times, write_csv
+
+# long-lived evaluation process: reads one JSON batch of parameters per line on stdin
+# and answers with one JSON line holding the rt/at/ast/dt/st counters and the CA time of every row,
+# and the start time and duration of the stages of the evaluation
+
+# runs the reconstruction config inside this interpreter, so the Python side of the
+# framework (cms, the Configuration.StandardSequences imports, the config itself) stays loaded.
+# The config is executed once per number of particles and events; the next batches of the same
+# size only get their cuts set on the CA modules of that process before a new event processor is
+# built from it, since the C++ modules take their parameters when they are constructed
+class CmsswBackend:
+    def __init__(self, config, input_file, num_events, num_threads, work_dir, options):
+        from FWCore.PythonFramework.CmsRun import CmsRun
+        self.CmsRun = CmsRun
+        self.config = config
+        self.input_file = input_file
+        self.num_events = num_events
+        self.num_threads = num_threads
+        self.work_dir = work_dir
+        self.options = options
+        self.stages = {}
+        self.process = None
+        self.size = None
+        self.search_space = None
+        # the modules imported before the first config, the others are dropped before the config runs again
+        self.base_modules = set(sys.modules)
+
+    # run a stage and keep its start time and duration
+    def timed(self, name, function, *args):
+        start = time.time()
+        result = function(*args)
+        self.stages[name] = [start, time.time() - start]
+        return result
+
+    # execute the config for a batch of this size, with fresh cff modules: the config changes
+    # the objects they hold (mix playback, aliases), which a second import would give back changed
+    def build(self, parameters_file, validation_result, times_file, num_events):
+        for name in set(sys.modules) - self.base_modules:
+            # compiled extensions cannot be loaded twice
+            if (getattr(sys.modules[name], '__file__', None) or '').endswith('.py'):
+                del sys.modules[name]
+        sys.argv = [self.config, 'inputFiles=file:' + self.input_file, 'nEvents=' + str(num_events),
+                    'parametersFile=' + parameters_file, 'outputFile=' + validation_result, 'timesFile=' + times_file]
+        if self.num_threads:
+            sys.argv.append('numThreads=' + str(self.num_threads))
+        sys.argv += self.options
+        process = runpy.run_path(self.config, None, '__config__')['process']
+        from search_space import space
+        self.search_space = space(2 if process.pixelTracksCUDA0.type_().endswith('Phase2') else 1)
+        return process
+
+    # the cuts of the batch on the CA modules of the process built for its size
+    def set_cuts(self, params):
+        from config_builder import set_cuts
+        for i, row in enumerate(params):
+            set_cuts(getattr(self.process, 'pixelTracksCUDA' + str(i)), row, self.search_space)
+
+    def evaluate(self, params, num_events=None):
+        self.stages = {}
+        num_events = num_events or self.num_events
+        parameters_file = os.path.join(self.work_dir, 'parameters.csv')
+        validation_result = os.path.join(self.work_dir, 'simple_validation.root')
+        times_file = os.path.join(self.work_dir, 'times.json')
+        self.timed('write_parameters', write_csv, parameters_file, params)
+        if self.size != (len(params), num_events):
+            # dropped first: a failed build must not leave the process of another size behind
+            self.process, self.size = None, None
+            self.process = self.timed('config', self.build, parameters_file, validation_result, times_file, num_events)
+            self.size = (len(params), num_events)
+        else:
+            self.timed('config', self.set_cuts, params)
+        runner = self.timed('startup', self.CmsRun, self.process)
+        self.timed('event_loop', runner.run)
+        # the output files are closed when the event processor goes away
+        del runner
+        counters = self.timed('collect', read_counters, validation_result, len(params))
+        return list(np.column_stack([counters, get_times(times_file, len(params))]))
+
+# counters of the particles of a validation result file
+def read_counters(validation_result, num_particles):
+    with uproot.open(validation_result) as uproot_file:
+        return get_counters_batch(uproot_file, range(num_particles))
+
+# local stand-in without CMSSW, used to exercise the protocol, with the analytic function of stand_in.py
+class StubBackend:
+    def __init__(self, config, input_file, num_events, num_threads, work_dir, options):
+        self.num_events = num_events
+        self.stages = {}
+
+    def evaluate(self, params, num_events=None):
+        return [analytic_counters(row, num_events or self.num_events) for row in params]
+
+BACKENDS = {'cmssw': CmsswBackend, 'stub': StubBackend}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', default='cmssw', choices=BACKENDS.keys())
+    parser.add_argument('--config', default='reconstruction.py')
+    parser.add_argument('--input_file', default='input/step2.root')
+    parser.add_argument('--num_events', default=100, type=int)
+    parser.add_argument('--num_threads', type=int)
+    parser.add_argument('--work_dir', default='temp/daemon')
+    parser.add_argument('--options', nargs='*', default=[])
+    args = parser.parse_args()
+
+    if not os.path.exists(args.work_dir):
+        os.makedirs(args.work_dir)
+    # keep the protocol on the original stdout and send everything else printed to a log
+    protocol = os.fdopen(os.dup(1), 'w')
+    log = open(os.path.join(args.work_dir, 'server.log'), 'a')
+    os.dup2(log.fileno(), 1)
+    sys.stdout = log
+
+    backend = BACKENDS[args.backend](args.config, args.input_file, args.num_events, args.num_threads, args.work_dir,
+                                     args.options)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            counters = backend.evaluate(request['params'], request.get('num_events'))
+            response = {'counters': [[float(value) for value in row] for row in counters], 'stages': backend.stages}
+        except Exception as e:
+            response = {'error': repr(e)}
+        protocol.write(json.dumps(response) + '\n')
+        protocol.flush()
+        log.flush()
+
+if __name__ == '__main__':
+    main()
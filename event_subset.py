@@ -0,0 +1,148 @@
+import argparse
+import os
+import re
+import numpy as np
+import uproot
+
+# products of the step2 file counted for every event: the tracking particles, and the simulated hits
+# of the pixel detector, split between barrel and endcaps for the eta coverage
+PRODUCTS = {'tracking_particles': re.compile(r'^TrackingParticles_mix_MergedTrackTruth_\w*\.$'),
+            'barrel_hits': re.compile(r'^PSimHits_g4SimHits_TrackerHitsPixelBarrel(Low|High)Tof_\w*\.$'),
+            'endcap_hits': re.compile(r'^PSimHits_g4SimHits_TrackerHitsPixelEndcap(Low|High)Tof_\w*\.$')}
+EVENT_ID = ['run_', 'luminosityBlock_', 'event_']
+FEATURES = ['tracking_particles', 'pixel_hits', 'endcap_fraction']
+
+# number of objects per event of a split collection, from the length of any of its numeric members
+def collection_sizes(tree, product):
+    for name in tree[product].keys(recursive=True):
+        if isinstance(tree[product][name].interpretation, uproot.AsJagged):
+            return np.array([len(values) for values in tree[product][name].array(library='np')])
+    raise ValueError('cannot count the objects of ' + product)
+
+# run, luminosity block and event number of every event, from the EventAuxiliary branch
+def event_ids(tree):
+    names = tree['EventAuxiliary'].keys(recursive=True)
+    ids = []
+    for member in EVENT_ID:
+        name = next((name for name in names if name.endswith('id_.' + member) or name.endswith('id_/' + member)), None)
+        if name is None:
+            raise ValueError('no ' + member + ' in EventAuxiliary')
+        ids.append(tree['EventAuxiliary'][name].array(library='np').astype(np.int64))
+    return np.column_stack(ids)
+
+# per-event counts of the input file, read once with uproot and kept next to it (recomputed when the file changes)
+def index(input_file):
+    index_file = input_file + '.index.npz'
+    if os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(input_file):
+        return dict(np.load(index_file))
+    with uproot.open(input_file) as f:
+        tree = f['Events']
+        counts = {}
+        for product, pattern in PRODUCTS.items():
+            branches = [name for name in tree.keys(recursive=False) if pattern.match(name)]
+            if not branches:
+                raise ValueError('no ' + product + ' in ' + input_file)
+            counts[product] = sum(collection_sizes(tree, branch) for branch in branches)
+        ids = event_ids(tree)
+    pixel_hits = counts['barrel_hits'] + counts['endcap_hits']
+    result = {'ids': ids, 'tracking_particles': counts['tracking_particles'], 'pixel_hits': pixel_hits,
+              'endcap_fraction': counts['endcap_hits'] / np.maximum(pixel_hits, 1)}
+    np.savez(index_file, **result)
+    return result
+
+# largest difference between the empirical distributions of a sample and of the whole population
+def ks_distance(sample, population):
+    values = np.sort(population)
+    return float(np.max(np.abs(np.searchsorted(np.sort(sample), values, side='right') / len(sample)
+                               - np.searchsorted(values, values, side='right') / len(values))))
+
+def max_distance(events, features):
+    return max(ks_distance(features[name][events], features[name]) for name in FEATURES)
+
+# radical inverse in base 2, to order the strata so that every prefix of the list spreads over all of them
+def van_der_corput(i):
+    result, base = 0.0, 0.5
+    while i:
+        result += base * (i & 1)
+        i >>= 1
+        base /= 2
+    return result
+
+# stratified subset of size events: the events are split into size strata of equal count by number of pixel hits
+# and one event is taken from each; the first trial takes the event closest to the median of its stratum in all
+# the features, the others a random one, and the trial closest to the whole sample in every feature is kept.
+# The events are ordered so that the first n of them are a stratified subset too (fidelity levels, -e < size)
+def select(features, size, trials=100):
+    num_events = len(features['pixel_hits'])
+    if size > num_events:
+        raise ValueError('the input has only %d events' % num_events)
+    standardized = np.column_stack([(features[name] - features[name].mean()) / max(features[name].std(), 1e-12)
+                                    for name in FEATURES])
+    strata = np.array_split(np.argsort(features['pixel_hits'], kind='stable'), size)
+    best, best_distance = None, np.inf
+    for trial in range(trials):
+        if trial == 0:
+            events = np.array([stratum[np.argmin(np.sum((standardized[stratum]
+                                                         - np.median(standardized[stratum], axis=0)) ** 2, axis=1))]
+                               for stratum in strata])
+        else:
+            events = np.array([np.random.choice(stratum) for stratum in strata])
+        distance = max_distance(events, features)
+        if distance < best_distance:
+            best, best_distance = events, distance
+    return best[sorted(range(size), key=van_der_corput)], best_distance
+
+def write_event_list(filename, ids):
+    with open(filename, 'w') as f:
+        for run, lumi, event in ids:
+            f.write('%d:%d:%d\n' % (run, lumi, event))
+
+def read_event_list(filename):
+    with open(filename) as f:
+        return f.read().split()
+
+def print_comparison(features, events):
+    print('%-20s %12s %12s %8s' % ('feature', 'all events', 'subset', 'KS'))
+    for name in FEATURES:
+        print('%-20s %12.3f %12.3f %8.3f' % (name, features[name].mean(), features[name][events].mean(),
+                                             ks_distance(features[name][events], features[name])))
+
+# objectives of the default cuts on the subset against the whole input, run with cmsRun
+def check(event_list, phase, num_shards):
+    from executor import ShardedExecutor
+    from search_space import space
+    from utils import compute_metrics_batch, effective_params
+    config = 'reconstruction_phase2.py' if phase == 2 else 'reconstruction.py'
+    input_file = 'input/step2_phase2.root' if phase == 2 else 'input/step2.root'
+    search_space = space(phase)
+    rows = [effective_params(search_space.defaults, search_space)]
+    print('%-12s %8s %16s %12s' % ('events', 'number', '1 - efficiency', 'fake rate'))
+    for label, options, num_events in (('all', [], -1),
+                                       ('subset', ['eventList=' + event_list], len(read_event_list(event_list)))):
+        executor = ShardedExecutor(config, input_file, num_events, num_shards=num_shards,
+                                   work_dir=os.path.join('temp', 'check_' + label), options=options)
+        fitness = compute_metrics_batch(executor.evaluate(rows, num_events))[0]
+        print('%-12s %8s %16.5f %12.5f' % (label, num_events if num_events >= 0 else 'all', *fitness))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['index', 'select', 'check'])
+    parser.add_argument('input', help='input file (index, select) or event list (check)')
+    parser.add_argument('-n', '--num_events', default=100, type=int, action='store')
+    parser.add_argument('-o', '--output', action='store')
+    parser.add_argument('--trials', default=100, type=int, action='store')
+    parser.add_argument('-p2', '--phase2', action='store_true')
+    parser.add_argument('-s', '--num_shards', default=1, type=int, action='store')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        check(args.input, 2 if args.phase2 else 1, args.num_shards)
+    else:
+        features = index(args.input)
+        print('%d events indexed' % len(features['ids']))
+        if args.command == 'select':
+            events, distance = select(features, args.num_events, args.trials)
+            output = args.output or os.path.join(os.path.dirname(args.input), 'subset_%d.txt' % args.num_events)
+            write_event_list(output, features['ids'][events])
+            print_comparison(features, events)
+            print('%d events written to %s, largest KS distance %.3f' % (len(events), output, distance))
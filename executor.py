@@ -0,0 +1,338 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import uproot
+from memory import MemoryModel, PeakMonitor
+from timing import Tracer
+from utils import get_counters_batch, get_times, write_csv
+
+# a cmsRun, or an evaluation server, that failed or left no usable output
+class EvaluationError(RuntimeError):
+    pass
+
+# counters given to a row that fails even alone: fitness 1, 1 through the zero guard, and an infinite time
+PENALTY = [0.0, 0.0, 0.0, 0.0, 0.0, float('inf')]
+# CA time per event in ms given to MOPSO for such a row with --time_objective: its crowding distance needs
+# finite objectives, and this is far beyond any real CA time
+PENALTY_TIME = 1e6
+
+# rows that made the evaluation fail even when run alone, with the reason, appended to a JSON-lines file
+# (kept in memory only without a filename); they get the penalty and are not run again
+class Quarantine:
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.entries = {}
+        if filename and os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[tuple(entry['params'])] = entry
+
+    def __contains__(self, row):
+        return tuple(float(value) for value in row) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, row, reason):
+        entry = {'params': [float(value) for value in row], 'reason': reason, 'time': time.time()}
+        self.entries[tuple(entry['params'])] = entry
+        print('quarantined a row:', reason, flush=True)
+        if self.filename:
+            directory = os.path.dirname(self.filename)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.filename, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+# evaluate the rows that are not quarantined with evaluate(rows), the others get the penalty right away
+def skip_quarantined(params, quarantine, evaluate):
+    params = np.asarray(params, dtype=float)
+    quarantined = np.array([row in quarantine for row in params], dtype=bool)
+    counters = np.tile(PENALTY, (len(params), 1))
+    if not quarantined.all():
+        counters[~quarantined] = evaluate(params[~quarantined])
+    return list(counters)
+
+# a batch failed: retry it, then split it in halves and recurse into the failing halves
+# until the rows that fail alone are found; those are quarantined and get the penalty,
+# the others keep their results. run(rows) returns the counters or raises EvaluationError.
+# When both halves of the first split fail, the failure is likely not due to the cuts (cmsRun missing,
+# a bad input): unless known_good (e.g. the default cuts) runs fine alone, give up without quarantining anything
+def isolate(params, run, retries, quarantine, error, known_good=None, first_split=True):
+    for attempt in range(retries):
+        try:
+            return list(run(params))
+        except EvaluationError as e:
+            error = e
+    if len(params) == 1:
+        quarantine.add(params[0], str(error))
+        return [PENALTY]
+    halves = np.array_split(np.asarray(params, dtype=float), 2)
+    results = []
+    for half in halves:
+        try:
+            results.append(list(run(half)))
+        except EvaluationError as e:
+            results.append(e)
+    if first_split and all(isinstance(result, EvaluationError) for result in results):
+        if known_good is None:
+            raise EvaluationError('both halves of the batch fail, nothing quarantined: ' + str(results[-1]))
+        try:
+            run(np.asarray([known_good], dtype=float))
+        except EvaluationError as e:
+            raise EvaluationError('the known-good cuts fail as well, nothing quarantined: ' + str(e))
+    counters = []
+    for half, result in zip(halves, results):
+        if isinstance(result, EvaluationError):
+            result = isolate(half, run, 0, quarantine, result, first_split=False)
+        counters.extend(result)
+    return counters
+
+# run the population as several concurrent cmsRun processes, each in its own working directory
+class ShardedExecutor:
+    def __init__(self, config, input_file, num_events, num_shards=1, num_threads=None, work_dir='temp', options=(),
+                 tracer=None, quarantine=None, retries=1, memory_budget=None, on_batch=None, known_good=None):
+        self.config = config
+        self.input_file = input_file
+        self.num_events = num_events
+        self.num_shards = num_shards
+        self.num_threads = num_threads
+        self.work_dir = work_dir
+        self.options = list(options)
+        self.tracer = tracer or Tracer()
+        self.quarantine = quarantine if quarantine is not None else Quarantine()
+        self.retries = retries
+        # a row that should never fail (the default cuts), run alone when a whole batch fails
+        self.known_good = known_good
+        # with a budget in bytes, the peak memory of every cmsRun is measured and the batches are sized to fit
+        if memory_budget and not os.path.exists('/proc/self/status'):
+            raise RuntimeError('measuring the memory of cmsRun needs /proc')
+        self.memory_budget = memory_budget
+        self.memory_model = MemoryModel() if memory_budget else None
+        # called with the rows, counters and number of events of every batch as soon as it is done
+        self.on_batch = on_batch
+
+    def shard_dir(self, shard):
+        return os.path.join(self.work_dir, 'shard' + str(shard))
+
+    # write the parameters of one shard and launch its cmsRun without waiting for it
+    def start(self, params, directory, num_events=None):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # never read the output of an earlier run
+        for name in ('simple_validation.root', 'times.json'):
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+        parameters_file = os.path.join(directory, 'parameters.csv')
+        with self.tracer.stage('write_parameters', directory=directory):
+            write_csv(parameters_file, params)
+        num_events = num_events or self.num_events
+        command = ['cmsRun', self.config, 'inputFiles=file:' + self.input_file, 'nEvents=' + str(num_events),
+                   'parametersFile=' + parameters_file, 'outputFile=' + os.path.join(directory, 'simple_validation.root'),
+                   'timesFile=' + os.path.join(directory, 'times.json')]
+        if self.num_threads:
+            command.append('numThreads=' + str(self.num_threads))
+        command += self.options
+        with open(os.path.join(directory, 'cmsRun.log'), 'w') as log:
+            process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        process.start_time = time.time()
+        process.num_rows = len(params)
+        if self.memory_model is not None:
+            process.monitor = PeakMonitor(process)
+        return process
+
+    # trace the stages of a cmsRun that was just seen finished and learn its peak memory
+    def finished(self, process, directory):
+        self.tracer.cmsrun(os.path.join(directory, 'cmsRun.log'), process.start_time, time.time(), directory=directory)
+        if self.memory_model is not None:
+            peak = process.monitor.stop()
+            if process.returncode == 0:
+                self.memory_model.add(process.num_rows, peak)
+
+    # read the counters of a finished shard, each row followed by the CA time per event;
+    # raise EvaluationError when cmsRun failed or did not write all the validation trees
+    def collect(self, process, directory, num_particles):
+        log_file = os.path.join(directory, 'cmsRun.log')
+        if process.returncode:
+            raise EvaluationError('cmsRun exited with code %d, see %s' % (process.returncode, log_file))
+        validation_result = os.path.join(directory, 'simple_validation.root')
+        if not os.path.exists(validation_result) or os.path.getmtime(validation_result) < process.start_time - 1:
+            raise EvaluationError('cmsRun wrote no ' + validation_result + ', see ' + log_file)
+        try:
+            with self.tracer.stage('collect', directory=directory), uproot.open(validation_result) as uproot_file:
+                counters = get_counters_batch(uproot_file, range(num_particles))
+        except Exception as e:
+            raise EvaluationError('incomplete ' + validation_result + ': ' + repr(e))
+        return list(np.column_stack([counters, get_times(os.path.join(directory, 'times.json'), num_particles)]))
+
+    # run one batch in a directory and wait for it
+    def run(self, params, directory, num_events=None):
+        process = self.start(params, directory, num_events)
+        process.wait()
+        self.finished(process, directory)
+        return self.collect(process, directory, len(params))
+
+    # the counters of a finished batch, isolating the failing rows if it failed
+    def result(self, process, directory, params, num_events=None):
+        try:
+            return self.collect(process, directory, len(params))
+        except EvaluationError as e:
+            print('batch of %d rows failed: %s' % (len(params), e), flush=True)
+            with self.tracer.stage('isolate', directory=directory, rows=len(params)):
+                return isolate(params, lambda rows: self.run(rows, directory, num_events), self.retries, self.quarantine, e,
+                               self.known_good)
+
+    def evaluate(self, params, num_events=None):
+        return skip_quarantined(params, self.quarantine, lambda rows: self.evaluate_rows(rows, num_events))
+
+    # split the rows into contiguous shards and run them concurrently,
+    # or into batches that fit the memory budget when there is one
+    def evaluate_rows(self, params, num_events=None):
+        if not len(params):
+            return []
+        params = np.asarray(params, dtype=float)
+        if self.memory_budget:
+            return self.evaluate_budgeted(params, num_events)
+        return self.run_batches(np.array_split(params, min(self.num_shards, len(params))), self.num_shards, num_events)
+
+    # run the batches with at most num_concurrent at a time and merge the counters in row order
+    def run_batches(self, batches, num_concurrent, num_events=None):
+        pending = list(range(len(batches)))
+        running = {}
+        counters = [None] * len(batches)
+        # poll rather than wait in order, so that each batch's end time is seen and its slot reused at once
+        while pending or running:
+            for slot in range(num_concurrent):
+                if slot not in running and pending:
+                    i = pending.pop(0)
+                    running[slot] = (i, self.start(batches[i], self.shard_dir(slot), num_events))
+            time.sleep(0.01)
+            for slot, (i, process) in list(running.items()):
+                if process.poll() is not None:
+                    self.finished(process, self.shard_dir(slot))
+                    counters[i] = self.result(process, self.shard_dir(slot), batches[i], num_events)
+                    del running[slot]
+                    if self.on_batch is not None:
+                        self.on_batch(batches[i], counters[i], num_events or self.num_events)
+        return [row for batch in counters for row in batch]
+
+    # until the memory model is calibrated, run the first row alone and then a few rows, keeping their results;
+    # then evaluate the other rows in the batch size and concurrency the model says fit the budget
+    def evaluate_budgeted(self, params, num_events=None):
+        counters = []
+        while not self.memory_model.calibrated() and len(counters) < len(params):
+            size = 1 if not self.memory_model.num_rows else min(4, len(params) - len(counters))
+            counters += self.run_batches([params[len(counters):len(counters) + size]], 1, num_events)
+        remaining = params[len(counters):]
+        if not len(remaining):
+            return counters
+        plan = self.memory_model.plan(len(remaining), self.memory_budget, self.num_shards)
+        if plan is None:
+            raise RuntimeError('the memory budget of %.2f GB does not fit one particle' % (self.memory_budget / 1e9))
+        num_concurrent, batch_size = plan
+        base, per_row = self.memory_model.fit()
+        print('memory: %.2f GB + %.1f MB per particle, %d rows in batches of %d, %d at a time'
+              % (base / 1e9, per_row / 1e6, len(remaining), batch_size, num_concurrent), flush=True)
+        batches = [remaining[start:start + batch_size] for start in range(0, len(remaining), batch_size)]
+        return counters + self.run_batches(batches, num_concurrent, num_events)
+
+# keep one warm evaluation_server.py per shard and send it each new batch through a pipe
+class DaemonExecutor:
+    def __init__(self, config, input_file, num_events, num_shards=1, num_threads=None, work_dir='temp', options=(),
+                 backend='cmssw', tracer=None, quarantine=None, retries=1, on_batch=None, known_good=None):
+        self.tracer = tracer or Tracer()
+        self.quarantine = quarantine if quarantine is not None else Quarantine()
+        self.retries = retries
+        self.known_good = known_good
+        self.num_events = num_events
+        self.on_batch = on_batch
+        self.commands = []
+        for shard in range(num_shards):
+            command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'evaluation_server.py'),
+                       '--backend', backend, '--config', config, '--input_file', input_file,
+                       '--num_events', str(num_events), '--work_dir', os.path.join(work_dir, 'daemon' + str(shard))]
+            if num_threads:
+                command += ['--num_threads', str(num_threads)]
+            if options:
+                command += ['--options', *options]
+            self.commands.append(command)
+        self.servers = [self.spawn(command) for command in self.commands]
+
+    def spawn(self, command):
+        return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+    # a server that died is noticed by receive
+    def send(self, shard, params, num_events):
+        try:
+            self.servers[shard].stdin.write(json.dumps({'params': np.asarray(params).tolist(), 'num_events': num_events}) + '\n')
+            self.servers[shard].stdin.flush()
+        except BrokenPipeError:
+            pass
+
+    # read the answer of a server; a server that died is replaced before raising
+    def receive(self, shard, start):
+        line = self.servers[shard].stdout.readline()
+        if not line:
+            code = self.servers[shard].wait()
+            self.servers[shard] = self.spawn(self.commands[shard])
+            raise EvaluationError('evaluation server exited with code ' + str(code))
+        response = json.loads(line)
+        if 'error' in response:
+            raise EvaluationError('evaluation server failed: ' + response['error'])
+        self.tracer.record('daemon', start, time.time() - start, shard=shard)
+        for name, (stage_start, seconds) in response.get('stages', {}).items():
+            self.tracer.record(name, stage_start, seconds, shard=shard)
+        return response['counters']
+
+    def run(self, shard, params, num_events=None):
+        self.send(shard, params, num_events)
+        return self.receive(shard, time.time())
+
+    def evaluate(self, params, num_events=None):
+        return skip_quarantined(params, self.quarantine, lambda rows: self.evaluate_rows(rows, num_events))
+
+    # send one shard to every server first, then wait for the answers in order
+    def evaluate_rows(self, params, num_events=None):
+        if not len(params):
+            return []
+        shards = np.array_split(np.asarray(params, dtype=float), min(len(self.servers), len(params)))
+        start = time.time()
+        for k, shard in enumerate(shards):
+            self.send(k, shard, num_events)
+        counters = []
+        for k, shard in enumerate(shards):
+            try:
+                try:
+                    shard_counters = list(self.receive(k, start))
+                except EvaluationError as e:
+                    print('batch of %d rows failed: %s' % (len(shard), e), flush=True)
+                    shard_counters = isolate(shard, lambda rows: self.run(k, rows, num_events), self.retries,
+                                             self.quarantine, e, self.known_good)
+            except Exception:
+                self.drain(shards, k + 1, start, num_events)
+                raise
+            if self.on_batch is not None:
+                self.on_batch(shard, shard_counters, num_events or self.num_events)
+            counters.extend(shard_counters)
+        return counters
+
+    # read the answers of the servers still busy with the shards from first on, so that the next batch does
+    # not take them for its own; the ones that came back are still logged
+    def drain(self, shards, first, start, num_events):
+        for k in range(first, len(shards)):
+            try:
+                shard_counters = list(self.receive(k, start))
+            except EvaluationError:
+                continue
+            if self.on_batch is not None:
+                self.on_batch(shards[k], shard_counters, num_events or self.num_events)
+
+    def close(self):
+        for server in self.servers:
+            server.stdin.close()
+            server.wait()
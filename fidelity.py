@@ -0,0 +1,32 @@
+import numpy as np
+from utils import pareto_ranks
+
+# event budgets of each fidelity level, eta times larger from one level to the next, ending at num_events
+def fidelity_budgets(num_events, num_levels, eta):
+    return [max(1, num_events // eta ** (num_levels - 1 - level)) for level in range(num_levels)]
+
+# distance of each row of fitness to a front, both to be minimized on the columns of the front: the smallest
+# improvement on every objective that leaves the row dominated by no point of the front, negative for rows
+# that are already beyond it
+def front_distances(fitness, front):
+    fitness = np.asarray(fitness, dtype=float)[:, :front.shape[1]]
+    return np.max(np.min(fitness[:, None, :] - front[None, :, :], axis=2), axis=1)
+
+# evaluate every row with the smallest budget, then promote the best 1/eta of the remaining rows to the next
+# budget until the last level: the closest to front (the fitness of the archive, evaluated at full fidelity)
+# or, without a front, the best by non-dominated rank among them of the first num_objectives columns (all of
+# them by default); evaluate(rows, num_events) returns one fitness row per row
+def successive_halving(rows, evaluate, budgets, eta, num_objectives=None, front=None):
+    fitness = np.array(evaluate(rows, budgets[0]), dtype=float)
+    levels = np.zeros(len(rows), dtype=int)
+    candidates = np.arange(len(rows))
+    for level in range(1, len(budgets)):
+        num_promoted = int(np.ceil(len(candidates) / eta))
+        if front is not None and len(front):
+            order = np.argsort(front_distances(fitness[candidates], np.asarray(front, dtype=float)), kind='stable')
+        else:
+            order = np.argsort(pareto_ranks(fitness[candidates, :num_objectives]), kind='stable')
+        candidates = candidates[order[:num_promoted]]
+        fitness[candidates] = evaluate([rows[i] for i in candidates], budgets[level])
+        levels[candidates] = level
+    return fitness.tolist(), levels
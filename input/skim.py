@@ -0,0 +1,72 @@
+# Pixel-only skim of the step2 file: only the products read by reconstruction.py (or reconstruction_phase2.py
+# with phase2=True), with the raw data reduced to the pixel FEDs, written with a fast compression.
+# cmsRun skim.py inputFiles=file:step2.root outputFile=step2_skim.root
+import FWCore.ParameterSet.Config as cms
+from FWCore.ParameterSet.VarParsing import VarParsing
+
+options = VarParsing('analysis')
+
+options.register('phase2',
+              False,
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.bool,
+              'Phase-2 input')
+
+options.parseArguments()
+
+process = cms.Process('SKIM')
+process.load('FWCore.MessageService.MessageLogger_cfi')
+process.MessageLogger.cerr.FwkReport.reportEvery = 100
+
+process.maxEvents = cms.untracked.PSet(
+    input = cms.untracked.int32(options.maxEvents)
+)
+
+process.source = cms.Source('PoolSource',
+    fileNames = cms.untracked.vstring(options.inputFiles)
+)
+
+# truth read by tpClusterProducer, the track associator and SimpleValidation (the TrackingParticles refer to the
+# SimTracks and GenParticles), the pixel simulated hits indexed by event_subset.py, and the beamspot if present;
+# the configs run the mixing module in playback mode and restore the random engines of the simulation, so the
+# playback info of mix and the saved engine states are kept as well
+outputCommands = [
+    'drop *',
+    'keep *_mix_*_*',
+    'keep *_randomEngineStateProducer_*_*',
+    'keep recoGenParticles_genParticles_*_*',
+    'keep SimTracks_g4SimHits_*_*',
+    'keep SimVertexs_g4SimHits_*_*',
+    'keep PSimHits_g4SimHits_TrackerHitsPixel*_*',
+    'keep *_offlineBeamSpot_*_*'
+]
+
+if options.phase2:
+    # the Phase-2 config starts from the pixel digis, stored with their links to the simulation
+    outputCommands += ['keep *_simSiPixelDigis_*_*']
+    steps = []
+else:
+    # the raw data of the pixel FEDs, plus the scalers, TCDS and online metadata unpacked by RawToDigi_pixelOnly,
+    # under the same label so that the config reads it unchanged
+    process.rawDataCollector = cms.EDProducer('EvFFEDSelector',
+        inputTag = cms.InputTag('rawDataCollector', '', cms.InputTag.skipCurrentProcess()),
+        fedList = cms.vuint32(735, 1022, 1024, *range(1200, 1350))
+    )
+    process.skim_step = cms.Path(process.rawDataCollector)
+    steps = [process.skim_step]
+    outputCommands += [
+        'keep FEDRawDataCollection_rawDataCollector_*_SKIM',
+        'keep PixelDigiSimLinkedmDetSetVector_simSiPixelDigis_*_*',
+        'keep StripDigiSimLinkedmDetSetVector_simSiStripDigis_*_*',
+        'keep *_hltSiStripRawToClustersFacility_*_*'
+    ]
+
+process.skimOutput = cms.OutputModule('PoolOutputModule',
+    fileName = cms.untracked.string(options.outputFile),
+    outputCommands = cms.untracked.vstring(*outputCommands),
+    compressionAlgorithm = cms.untracked.string('LZ4'),
+    compressionLevel = cms.untracked.int32(4)
+)
+process.output_step = cms.EndPath(process.skimOutput)
+
+process.schedule = cms.Schedule(*steps, process.output_step)
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+import numpy as np
+
+# peak resident memory so far of a process and (with children) its children, in bytes, from /proc (0 once it is gone)
+def peak_rss(pid, children=True):
+    total = 0
+    try:
+        with open('/proc/%d/status' % pid) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    total += int(line.split()[1]) * 1024
+        if not children:
+            return total
+        for task in os.listdir('/proc/%d/task' % pid):
+            with open('/proc/%d/task/%s/children' % (pid, task)) as f:
+                for child in f.read().split():
+                    total += peak_rss(int(child))
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return total
+
+# follow the peak memory of a running process in a background thread; the peak is sampled,
+# so the last interval before the process exits can be missed, which the safety margin covers
+class PeakMonitor:
+    def __init__(self, process, interval=0.2, children=True):
+        self.process = process
+        self.interval = interval
+        self.children = children
+        self.peak = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.process.returncode is None:
+            self.peak = max(self.peak, peak_rss(self.process.pid, self.children))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.thread.join()
+        return self.peak
+
+# linear model of the peak memory of a cmsRun with one CA instance per row, fitted on the runs seen so far:
+# a fixed part (framework, conditions, geometry) plus a part per row
+class MemoryModel:
+    def __init__(self, safety=0.9):
+        self.safety = safety
+        self.num_rows = []
+        self.peaks = []
+
+    def add(self, num_rows, peak):
+        if peak > 0:
+            self.num_rows.append(num_rows)
+            self.peaks.append(peak)
+
+    # two different batch sizes are needed to separate the fixed part from the part per row
+    def calibrated(self):
+        return len(set(self.num_rows)) >= 2
+
+    # fixed part and part per row in bytes; the fixed part is the upper envelope of the runs, to stay on the safe side
+    def fit(self):
+        num_rows, peaks = np.array(self.num_rows, dtype=float), np.array(self.peaks, dtype=float)
+        per_row = max(np.polyfit(num_rows, peaks, 1)[0], 0.0)
+        return float(np.max(peaks - per_row * num_rows)), float(per_row)
+
+    # number of concurrent batches (at most max_concurrent) and batch size that evaluate num_rows rows in the
+    # fewest waves within the budget, preferring more concurrent batches; None when not even one row fits
+    def plan(self, num_rows, budget, max_concurrent):
+        base, per_row = self.fit()
+        best = None
+        for concurrent in range(1, max_concurrent + 1):
+            room = budget * self.safety / concurrent - base
+            batch_size = int(np.ceil(num_rows / concurrent))
+            if per_row > 0:
+                batch_size = min(batch_size, int(room // per_row))
+            if batch_size < 1 or room < 0:
+                break
+            waves = int(np.ceil(num_rows / (concurrent * batch_size)))
+            if best is None or waves <= best[0]:
+                best = (waves, concurrent, batch_size)
+        return None if best is None else best[1:]
@@ -1,10 +1,26 @@
 from optimizer.mopso import MOPSO
-import subprocess
-from utils import get_metrics, write_csv
+from utils import atomic_open, compute_metrics_batch, effective_params, read_csv, split_times, write_csv
+from cache import EvaluationCache
+from executor import PENALTY_TIME, ShardedExecutor, DaemonExecutor, Quarantine
+from replay import ReplayExecutor, ReplayIndex
+from spool import SpoolExecutor
+from fidelity import fidelity_budgets, successive_halving
+from surrogate import Surrogate
+from store import EvaluationStore
+from archive import ParetoArchive
+from async_pso import AsyncMOPSO
+from timing import Tracer
+from wal import EvaluationLog
+from search_space import SearchSpace, legacy_space, space
+from event_subset import read_event_list
+from warm_start import initial_positions, read_seeds
+from screening import load_report, morris_design, morris_effects, print_report, ranking, save_report, weakest
 import numpy as np
-import uproot
 import argparse
+import json
 import os
+import subprocess
+import time
 
 # parsing argument
 parser = argparse.ArgumentParser()
@@ -14,85 +30,475 @@ parser.add_argument('-p2', '--phase2', action='store_true')
 parser.add_argument('-p', '--num_particles', default=200, type=int, action='store')
 parser.add_argument('-i', '--num_iterations', default=20, type=int, action='store')
 parser.add_argument('-e', '--num_events', default=100, type=int, action='store')
+parser.add_argument('-s', '--num_shards', default=1, type=int, action='store')
+parser.add_argument('-t', '--num_threads', type=int, action='store')
+parser.add_argument('-f', '--fidelity_levels', default=1, type=int, action='store')
+parser.add_argument('--eta', default=3, type=int, action='store')
+parser.add_argument('--surrogate', type=float, action='store')
+parser.add_argument('--csv_history', action='store_true')
+parser.add_argument('--archive_epsilon', type=float, action='store')
+parser.add_argument('--archive_size', type=int, action='store')
+parser.add_argument('-a', '--asynchronous', type=int, action='store')
+parser.add_argument('--slot_batch', default=10, type=int, action='store')
+parser.add_argument('--prepared', action='store_true')
+parser.add_argument('--skim', action='store_true')
+parser.add_argument('--executor', default='spawn', choices=['spawn', 'daemon', 'spool', 'replay'], action='store')
+parser.add_argument('--backend', default='cmssw', choices=['cmssw', 'stub'], action='store')
+parser.add_argument('--spool', default='spool', action='store')
+parser.add_argument('--lease_timeout', default=600, type=float, action='store')
+parser.add_argument('--replay', nargs='+', action='store')
+parser.add_argument('--replay_neighbours', default=8, type=int, action='store')
+parser.add_argument('--inertia_weight', default=0.5, type=float, action='store')
+parser.add_argument('--cognitive_coefficient', default=1, type=float, action='store')
+parser.add_argument('--social_coefficient', default=1, type=float, action='store')
+parser.add_argument('--time_objective', action='store_true')
+parser.add_argument('--max_time_ratio', type=float, action='store')
+parser.add_argument('--no_trace', action='store_true')
+parser.add_argument('--retries', default=1, type=int, action='store')
+parser.add_argument('--memory_budget', type=float, action='store')
+parser.add_argument('--freeze', nargs='+', default=[], action='store')
+parser.add_argument('--screen', type=int, action='store')
+parser.add_argument('--freeze_weakest', type=int, action='store')
+parser.add_argument('--screening_report', default='checkpoint/screening.json', action='store')
+parser.add_argument('--event_subset', action='store')
+parser.add_argument('--warm_start', nargs='+', action='store')
+parser.add_argument('--warm_fraction', default=0.5, type=float, action='store')
+parser.add_argument('--warm_spread', default=0.1, type=float, action='store')
+parser.add_argument('--cache', default='cache/evaluations.db', action='store')
+parser.add_argument('--no_cache', action='store_true')
+parser.add_argument('--seed', type=int, action='store')
 args = parser.parse_args()
+if args.asynchronous and (args.continuing or args.executor != 'spawn'):
+    parser.error('--asynchronous needs the spawn executor and a fresh run')
+if args.asynchronous and (args.time_objective or args.max_time_ratio):
+    parser.error('--asynchronous optimizes efficiency and fake rate only')
+# the slots of the asynchronous mode run --slot_batch particles each on the full events
+if args.asynchronous and (args.memory_budget or args.fidelity_levels > 1 or args.surrogate is not None
+                          or args.num_shards > 1):
+    parser.error('--memory_budget, -f, --surrogate and -s need the synchronous mode, --asynchronous sets its own slots')
+if args.memory_budget and args.executor != 'spawn':
+    parser.error('--memory_budget needs the spawn executor')
+if (args.freeze or args.freeze_weakest) and args.continuing:
+    parser.error('--freeze cannot change the search space of a continued run')
+if args.screen and args.continuing:
+    parser.error('--screen starts from a fresh search space')
+if args.warm_start and args.continuing:
+    parser.error('--warm_start seeds a new swarm, -c continues the old one')
+if not 0 <= args.warm_fraction <= 1:
+    parser.error('--warm_fraction is the fraction of the swarm placed on the earlier fronts, between 0 and 1')
+if (args.executor == 'replay') != bool(args.replay):
+    parser.error('--executor replay answers from the history stores given with --replay')
+if args.executor == 'replay' and args.prepared:
+    parser.error('--executor replay runs no cmsRun, --prepared is not needed')
+if args.event_subset and len(read_event_list(args.event_subset)) < args.num_events:
+    parser.error('--event_subset lists fewer events than -e')
+if args.fidelity_levels < 1 or args.eta < 2:
+    parser.error('-f needs at least one level and --eta at least 2')
+if len(set(fidelity_budgets(args.num_events, args.fidelity_levels, args.eta))) < args.fidelity_levels:
+    parser.error('-f %d with --eta %d gives fidelity levels with the same number of events %s, raise -e or lower -f'
+                 % (args.fidelity_levels, args.eta, fidelity_budgets(args.num_events, args.fidelity_levels, args.eta)))
+
+# --seed also fixes the initial swarm, the warm start and the screening design
+if args.seed is not None:
+    np.random.seed(args.seed)
 
-# define the lower and upper bounds
+# 1 - efficiency and fake rate, plus the CA time per event with --time_objective
+num_objectives = 3 if args.time_objective else 2
+needs_time = bool(args.time_objective or args.max_time_ratio)
+
+# config and input of each phase
 if args.phase2:
-    lb = [0.0, 0.0, 0.0, 0.0, 1.0 / 3.8 / 0.9, 5.0,
-          400, 400, 400, 400, 400, 400, 400, 400, 400, 400, 400, 
-          400, 400, 400, 400, 400, 400, 400, 400, 400, 400, 400,
-          400, 400, 400, 400, 400, 400, 400, 400, 400, 400, 400,
-          400, 400, 400, 400, 400, 400, 400, 400, 400, 400, 400,
-          400, 400, 400, 400, 400, 400, 400, 400, 400, 400, 400]
-
-    ub = [0.006, 0.03, 0.2, 1.0, 1.0 / 3.8 / 0.3, 20.0,
-          1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000,
-          1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000,
-          1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000,
-          1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000,
-          1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000]
-    
     config = 'reconstruction_phase2.py'
     input_file = 'input/step2_phase2.root'
+    prepared_file = 'input/prepared_phase2.root'
 else:
-    lb = [0.0, 0.0, 0.0, 0.0, 1.0 / 3.8 / 0.9, 5.0, 400, 
-          400, 400, 400, 400, 400, 400, 400, 400, 400, 
-          400, 400, 400, 400, 400, 400, 400, 400, 400]
-
-    ub = [0.006, 0.03, 0.2, 1.0, 1.0 / 3.8 / 0.3, 20.0, 1000,
-          1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 
-          1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000, 1000]
-    
     config = 'reconstruction.py'
     input_file = 'input/step2.root'
+    prepared_file = 'input/prepared.root'
+
+# the search space of the cuts: the optimizer moves in the free dimensions only, the theta and curvature cuts
+# in log scale, and its positions are turned into cuts before every evaluation; a continued run keeps its space
+if args.continuing and os.path.exists('checkpoint/search_space.json'):
+    search_space = SearchSpace.load('checkpoint/search_space.json')
+elif args.continuing:
+    # a checkpoint written before the search space: MOPSO saved the cuts themselves as positions
+    search_space = legacy_space(2 if args.phase2 else 1)
+    search_space.save('checkpoint/search_space.json')
+    print('checkpoint without search_space.json: continuing on the cuts themselves, in linear scale')
+else:
+    search_space = space(2 if args.phase2 else 1).freeze(args.freeze)
+    if args.freeze_weakest:
+        search_space.freeze(weakest(load_report(args.screening_report), args.freeze_weakest))
+    if not os.path.exists('checkpoint'):
+        os.mkdir('checkpoint')
+    search_space.save('checkpoint/search_space.json')
+lb, ub = search_space.lower_bounds, search_space.upper_bounds
+print('search space: %d of %d cuts free' % (len(search_space.free), len(search_space)))
+
+# warm start: part of the swarm starts on the fronts of earlier studies and the rest around them; the seeds
+# are read before this run clears its history and are evaluated again like any particle in the first iteration
+warm_positions = None
+if args.warm_start:
+    seeds = read_seeds(args.warm_start, len(search_space))
+    warm_positions = initial_positions(seeds, search_space, args.num_particles, args.warm_fraction, args.warm_spread)
+    print('warm start: %d points on the earlier fronts' % len(seeds))
+
+# the index of --executor replay, also read before the history of the previous run is moved away
+replay_index = None
+if args.executor == 'replay':
+    replay_index = ReplayIndex.from_stores(args.replay, space(2 if args.phase2 else 1), args.replay_neighbours)
+    print('replay: %d recorded evaluations' % len(replay_index))
+
+# pixel-only copy of the input written by input/skim.py, with only the products the config reads
+if args.skim:
+    input_file = input_file.replace('.root', '_skim.root')
+    prepared_file = prepared_file.replace('.root', '_skim.root')
+    if not os.path.exists(input_file):
+        parser.error(input_file + ' is missing, write it with input/skim.py')
+
+# run the parameter-independent part of the chain once and read its products in every iteration
+options = []
+if args.prepared:
+    if not os.path.exists(prepared_file):
+        subprocess.run(['cmsRun', config, 'stage=prepare', 'inputFiles=file:' + input_file, 'nEvents=-1',
+                        'outputFile=' + prepared_file], check=True)
+    input_file = prepared_file
+    options.append('stage=prepared')
+
+# process the first -e events of a representative subset written by event_subset.py instead of the first of the file
+if args.event_subset:
+    options.append('eventList=' + os.path.abspath(args.event_subset))
+
+# evaluation cache shared by all runs with the same config, input and number of events;
+# replayed results are interpolated, never cached with the real ones
+cache = None if args.no_cache or args.executor == 'replay' else EvaluationCache(args.cache, config, input_file, args.num_events,
+                                                      backend=args.backend if args.executor != 'spawn' else 'cmssw',
+                                                      event_list=args.event_subset,
+                                                      timing_setup={'num_threads': args.num_threads,
+                                                                    'num_shards': args.num_shards,
+                                                                    'slots': args.asynchronous,
+                                                                    'executor': args.executor})
+
+# a fresh run starts from an empty history; the one of the previous run is kept as history_[date of its last write]
+if not args.continuing and os.path.exists('history') and os.listdir('history'):
+    archived = 'history_' + time.strftime('%Y%m%d-%H%M%S', time.localtime(os.path.getmtime('history')))
+    while os.path.exists(archived):
+        archived += '_'
+    os.rename('history', archived)
+    print('history of the previous run moved to', archived)
+
+# stage timings of every iteration and shard, appended to history/trace.jsonl
+tracer = Tracer(None if args.no_trace else 'history/trace.jsonl')
+
+# cuts that make cmsRun fail even alone: penalized and never run again in this run
+quarantine = Quarantine('history/quarantine.jsonl')
+
+# the counters of every batch of the current iteration as soon as it is done, to continue a run killed in the middle
+# of an iteration without running again what it had finished; particles maps the cuts of the iteration to its particles
+wal = EvaluationLog('history/wal.jsonl')
+particles = {}
+
+def log_batch(rows, counters, num_events):
+    logged = [(particle, row, values) for row, values in zip(rows, counters)
+              for particle in particles.get(tuple(row), [])]
+    wal.append(iteration, [entry[0] for entry in logged], [entry[1] for entry in logged],
+               [entry[2] for entry in logged], num_events)
+
+# the default cuts, run alone when a whole batch fails to tell a broken setup from bad cuts
+known_good = effective_params(search_space.defaults, search_space)
+
+# run pixel reconstruction and simple validation in concurrent shards,
+# spawning cmsRun every iteration, through long-lived evaluation servers, or through workers on other nodes;
+# or answer from the evaluations recorded by earlier runs, with the distance of every query in history/replay.csv
+if args.executor == 'replay':
+    if not args.continuing and os.path.exists('history/replay.csv'):
+        os.remove('history/replay.csv')
+    executor = ReplayExecutor(replay_index, tracer=tracer, quarantine=quarantine, distance_file='history/replay.csv')
+elif args.executor == 'spool':
+    executor = SpoolExecutor(args.spool, config, input_file, args.num_events, num_shards=args.num_shards,
+                             num_threads=args.num_threads, options=options, backend=args.backend,
+                             lease_timeout=args.lease_timeout, tracer=tracer,
+                             quarantine=quarantine, retries=args.retries, on_batch=log_batch,
+                             known_good=known_good)
+elif args.executor == 'daemon':
+    executor = DaemonExecutor(config, input_file, args.num_events, num_shards=args.num_shards,
+                              num_threads=args.num_threads, options=options, backend=args.backend, tracer=tracer,
+                              quarantine=quarantine, retries=args.retries, on_batch=log_batch,
+                              known_good=known_good)
+else:
+    executor = ShardedExecutor(config, input_file, args.num_events, num_shards=args.num_shards,
+                               num_threads=args.num_threads, options=options, tracer=tracer,
+                               quarantine=quarantine, retries=args.retries, on_batch=log_batch,
+                               known_good=known_good,
+                               memory_budget=args.memory_budget * 1e9 if args.memory_budget else None)
+
+# CA time per event of the default cuts, the reference of --max_time_ratio
+default_time = None
+
+# 1 - efficiency, fake rate and CA time per event of each row of counters;
+# rows slower than max_time_ratio times the default cuts get the worst efficiency and fake rate
+def objectives(counters):
+    fitness = compute_metrics_batch(counters)
+    times = split_times(counters)[1]
+    if args.max_time_ratio and default_time is not None:
+        fitness[times > args.max_time_ratio * default_time] = 1.0
+    return np.column_stack([fitness, times])
+
+# counters of the rows, those of particles already in the write-ahead log of this iteration taken from it
+def evaluate(rows, num_events):
+    counters = [None] * len(rows)
+    for i, row in enumerate(rows):
+        for particle in particles.get(tuple(row), []):
+            counters[i] = wal.get(iteration, particle, row, num_events)
+            if counters[i] is not None:
+                break
+    missing = [i for i in range(len(rows)) if counters[i] is None]
+    if len(missing) < len(rows):
+        print('write-ahead log: %d of %d rows already evaluated in this iteration' % (len(rows) - len(missing), len(rows)))
+    if missing:
+        for i, values in zip(missing, evaluate_rows([rows[i] for i in missing], num_events)):
+            counters[i] = values
+    return objectives(counters)
+
+# evaluate only the rows whose effective cuts are not cached yet, each distinct row once
+def evaluate_rows(rows, num_events):
+    if cache is None:
+        with tracer.stage('evaluate', rows=len(rows), num_events=num_events):
+            return executor.evaluate(rows, num_events)
+    with tracer.stage('cache', rows=len(rows)):
+        keys = [cache.key(row, num_events) for row in rows]
+        counters = cache.get(keys, needs_time=needs_time)
+    missing = {}
+    for key, row in zip(keys, rows):
+        if key not in counters and key not in missing:
+            missing[key] = row
+    if missing:
+        with tracer.stage('evaluate', rows=len(missing), num_events=num_events):
+            new_counters = executor.evaluate(list(missing.values()), num_events)
+        cache.put(list(missing.keys()), list(missing.values()), new_counters)
+        counters.update(zip(missing.keys(), new_counters))
+    print('cache: %d of %d rows evaluated with %d events' % (len(missing), len(rows), num_events))
+    return [counters[key] for key in keys]
+
+# fidelity levels: each batch is first run on a small number of events and
+# only the particles closest to the pareto front are promoted to more events
+budgets = fidelity_budgets(args.num_events, args.fidelity_levels, args.eta)
+
+# every evaluation of the run, with its iteration and particle index
+store = EvaluationStore('history/evaluations')
+iteration = int(store.load('iteration')['iteration'].max()) + 1 if len(store) else 0
+
+# non-dominated archive of the real evaluations at full fidelity
+archive = ParetoArchive(epsilon=args.archive_epsilon, max_size=args.archive_size)
+if args.continuing and os.path.exists('checkpoint/archive.csv'):
+    archive.merge(read_csv('checkpoint/archive.csv'), len(search_space))
+
+# surrogate model screening the particles, trained on every real evaluation
+surrogate = None
+if args.surrogate:
+    surrogate = Surrogate(lb, ub, num_objectives=num_objectives)
+    if args.continuing:
+        columns = store.load('params', 'fitness', 'predicted')
+        real_evaluations = (columns['predicted'] == 0) & np.all(np.isfinite(columns['fitness']), axis=1)
+        surrogate.add(search_space.from_params(columns['params'][real_evaluations]), columns['fitness'][real_evaluations])
+        surrogate.fit()
+
+# evaluations per hour since the start of the optimization, logged to compare the synchronous and asynchronous modes
+start_time = None
+num_evaluated = 0
+# end of the previous iteration, the time in between is spent in MOPSO
+last_end = None
+
+def record_throughput(mode, evaluations, seconds):
+    print('throughput: %.1f evaluations per hour (%s)' % (evaluations / seconds * 3600, mode))
+    with open('history/throughput.csv', 'a') as f:
+        f.write('%s,%d,%.3f,%.3f\n' % (mode, evaluations, seconds, evaluations / seconds * 3600))
 
 # run pixel reconstruction and simple validation
 def reco_and_validate(params):
-    if not os.path.exists('temp'):
-        os.mkdir('temp')
-    write_csv('temp/parameters.csv', params)
-    validation_result = 'temp/simple_validation.root'
-    subprocess.run(['cmsRun', config, 'inputFiles=file:' + input_file, 'nEvents=' + str(args.num_events),
-                     'parametersFile=temp/parameters.csv', 'outputFile=' + validation_result])
-    num_particles = len(params)
-    with uproot.open(validation_result) as uproot_file:
-        population_fitness = [get_metrics(uproot_file, i) for i in range(num_particles)]
-    return population_fitness
-
-phi0p05 = 522
-phi0p06 = 626
-phi0p07 = 730
-phi0p09 = 900
+    global iteration, start_time, num_evaluated, last_end
+    iteration_start = time.time()
+    if start_time is None:
+        start_time = iteration_start
+    if last_end is not None:
+        tracer.record('mopso', last_end, iteration_start - last_end, iteration=iteration - 1)
+    tracer.context['iteration'] = iteration
+    if not os.path.exists('history'):
+        os.mkdir('history')
+    # with --seed, the random numbers of an iteration are drawn from the seed and the iteration,
+    # so that a continued run moves the swarm as the interrupted one would have
+    if args.seed is not None:
+        np.random.seed([args.seed, iteration])
+    params = np.asarray(params, dtype=float)
+    rows = [effective_params(row, search_space) for row in search_space.to_params(params)]
+    wal.truncate(iteration)
+    for particle, row in enumerate(rows):
+        particles.setdefault(tuple(row), []).append(particle)
+    population_fitness = np.zeros((len(rows), num_objectives))
+    times = np.full(len(rows), np.nan)
+    levels = np.full(len(rows), len(budgets) - 1)
+    predicted = np.zeros(len(rows), dtype=np.int8)
+    uncertainty = np.zeros((len(rows), num_objectives))
+    real = np.arange(len(rows))
+    if surrogate is not None and surrogate.trained:
+        with tracer.stage('surrogate'):
+            real, mean, std = surrogate.screen(params, args.surrogate)
+        population_fitness[:, :2] = np.clip(mean[:, :2], 0.0, 1.0)
+        population_fitness[:, 2:] = np.maximum(mean[:, 2:], 0.0)
+        uncertainty[:] = std
+        uncertainty[real] = 0
+        predicted[:] = 1
+        predicted[real] = 0
+        levels[:] = -1
+    real_rows = [rows[i] for i in real]
 
-# get default metrics
-if args.default:
-    if args.phase2:
-        default_params = [[0.0020000000949949026, 0.003000000026077032, 0.15000000596046448, 0.25, 0.03284072249589491, 7.5,
-                           phi0p05, phi0p05, phi0p05, phi0p06, phi0p07, phi0p07, phi0p06, phi0p07, phi0p07, phi0p05, phi0p05,
-                           phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05,
-                           phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p07, phi0p07, phi0p07, phi0p07,
-                           phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07,
-                           phi0p07, phi0p07, phi0p07, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05]]
+    if len(budgets) == 1:
+        real_results = evaluate(real_rows, args.num_events)
+        levels[real] = len(budgets) - 1
     else:
-        default_params = [[0.0020000000949949026, 0.003000000026077032, 0.15000000596046448, 0.25, 0.03284072249589491, 
-                           12.0, phi0p05, phi0p07, phi0p07, phi0p05, phi0p06, phi0p06, phi0p05, phi0p05, phi0p06, 
-                           phi0p06, phi0p06, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05]]
-        
-    default_metrics = reco_and_validate(default_params)
-    write_csv('checkpoint/default.csv', [np.concatenate([default_params[0], default_metrics[0]])])
-
-        
+        # promoted by closeness to the front of the full-fidelity evaluations so far
+        real_results, levels[real] = successive_halving(real_rows, evaluate, budgets, args.eta, num_objectives,
+                                                        np.asarray(archive.fitness, dtype=float).reshape(-1, 2))
+    real_results = np.asarray(real_results).reshape(-1, 3)
+    population_fitness[real] = real_results[:, :num_objectives]
+    times[real] = real_results[:, 2]
+    # MOPSO needs finite objectives: the rows that crashed cmsRun get a large CA time rather than an infinite one
+    population_fitness[:, 2:][np.isinf(population_fitness[:, 2:])] = PENALTY_TIME
+    num_evaluated += len(real)
+
+    if surrogate is not None:
+        # prediction error on the particles that were evaluated for real
+        if surrogate.trained:
+            error = np.abs(mean[real] - population_fitness[real])
+            coverage = np.mean(error <= 2 * std[real])
+            print('surrogate: mean absolute error %.5f (1 - eff), %.5f (fake rate), %.0f%% within 2 sigma'
+                  % (error[:, 0].mean(), error[:, 1].mean(), 100 * coverage))
+            with open('history/surrogate.csv', 'a') as f:
+                f.write('%d,%d,%d,%.18f,%.18f,%.18f\n' % (iteration, len(surrogate.x), len(real),
+                                                          error[:, 0].mean(), error[:, 1].mean(), coverage))
+        with tracer.stage('surrogate'):
+            # penalized rows and unknown times would throw off the fit
+            finite = np.all(np.isfinite(population_fitness[real]), axis=1) & ~np.isinf(times[real])
+            surrogate.add(params[real][finite], population_fitness[real][finite])
+            surrogate.fit()
+
+    # the fidelity level is -1 and the uncertainty non-zero for particles whose fitness is only predicted
+    num_events = np.where(levels >= 0, np.array(budgets)[np.maximum(levels, 0)], 0)
+    store_start = time.time()
+    store.append(iteration=np.full(len(rows), iteration, dtype=np.int32), particle=np.arange(len(rows), dtype=np.int32),
+                 params=np.asarray(rows, dtype=float), fitness=population_fitness, time=times,
+                 fidelity=levels.astype(np.int32), num_events=num_events.astype(np.int32),
+                 predicted=predicted, uncertainty=uncertainty)
+    particles.clear()
+
+    if not os.path.exists('checkpoint'):
+        os.mkdir('checkpoint')
+    full_fidelity = levels == len(budgets) - 1
+    archive.insert_many(np.asarray(rows, dtype=float)[full_fidelity], population_fitness[full_fidelity, :2])
+    archive.save('checkpoint/archive.csv')
+    tracer.record('store', store_start, time.time() - store_start)
+    if len(budgets) > 1:
+        with atomic_open('checkpoint/fidelity.json') as f:
+            json.dump({'budgets': budgets, 'eta': args.eta, 'iteration': iteration,
+                       'levels': levels.tolist()}, f, indent=4)
+    iteration += 1
+    record_throughput('synchronous', num_evaluated, time.time() - start_time)
+    last_end = time.time()
+    tracer.record('iteration', iteration_start, last_end - iteration_start)
+    del tracer.context['iteration']
+    return population_fitness.tolist()
+
+# get default metrics
+if args.default or args.max_time_ratio:
+    default_params = [search_space.defaults]
+    default_metrics = evaluate([effective_params(row, search_space) for row in default_params], args.num_events)
+    default_time = default_metrics[0, 2]
+    print('default cuts: CA time %.3f ms per event' % default_time)
+    if args.max_time_ratio and np.isnan(default_time):
+        raise RuntimeError('--max_time_ratio needs the FastTimerService summary of the default cuts')
+    if args.default:
+        write_csv('checkpoint/default.csv', [np.concatenate([default_params[0], default_metrics[0, :2]])])
+
+
+# screening: rank the free cuts by their Morris elementary effects on the objectives, evaluated in one batch
+# of screen * (free cuts + 1) rows, and stop; --freeze_weakest then freezes the least influential ones
+if args.screen:
+    design, steps = morris_design(len(lb), args.screen)
+    positions = np.asarray(lb) + design * (np.asarray(ub) - np.asarray(lb))
+    with tracer.stage('screening', rows=len(positions)):
+        screen_rows = [effective_params(row, search_space) for row in search_space.to_params(positions)]
+        screen_results = evaluate(screen_rows, args.num_events)
+    # rows that crashed cmsRun: an infinite time, or quarantined by an earlier run
+    failed = np.isinf(screen_results[:, 2]) | np.array([row in quarantine for row in screen_rows])
+    if failed.any():
+        print('screening: %d of %d trajectories left out, they contain a row that failed'
+              % (len(set(np.flatnonzero(failed) // (len(lb) + 1))), args.screen))
+    mu_star, sigma = morris_effects(screen_results[:, :num_objectives], steps, len(lb), failed)
+    report = ranking([search_space.names[i] for i in search_space.free], mu_star, sigma, len(positions))
+    save_report(args.screening_report, report)
+    print_report(report)
+    if args.executor == 'daemon':
+        executor.close()
+    tracer.close()
+    wal.close()
+    raise SystemExit
+
 # create the PSO object
-if not args.continuing:
-    os.system('rm history/*')
-    pso = MOPSO(objective_functions=[reco_and_validate],lower_bounds=lb, upper_bounds=ub, 
-                num_objectives=2, num_particles=args.num_particles, num_iterations=args.num_iterations, 
-                inertia_weight=0.5, cognitive_coefficient=1, social_coefficient=1, 
-                max_iter_no_improv=None, optimization_mode='global')
+if args.asynchronous:
+    # steady-state mode: every finished particle is recorded with its own generation as iteration
+    def record(generation, particle, row, fitness, time):
+        store.append(iteration=np.array([generation], dtype=np.int32), particle=np.array([particle], dtype=np.int32),
+                     params=np.array([row], dtype=float), fitness=np.array([fitness]), time=np.array([time]),
+                     fidelity=np.zeros(1, dtype=np.int32), num_events=np.array([args.num_events], dtype=np.int32),
+                     predicted=np.zeros(1, dtype=np.int8), uncertainty=np.zeros((1, 2)))
+
+    if not os.path.exists('history'):
+        os.mkdir('history')
+    if not os.path.exists('checkpoint'):
+        os.mkdir('checkpoint')
+    pso = AsyncMOPSO(executor, archive, search_space, args.num_particles, args.num_events, num_slots=args.asynchronous,
+                     slot_batch=args.slot_batch, inertia_weight=args.inertia_weight,
+                     cognitive_coefficient=args.cognitive_coefficient, social_coefficient=args.social_coefficient,
+                     cache=cache)
+    if warm_positions is not None:
+        pso.positions[:] = warm_positions
+        pso.best_positions[:] = warm_positions
+    start_time = time.time()
+    pso.optimize(args.num_iterations * args.num_particles, on_result=record)
+    record_throughput('asynchronous', pso.evaluations, time.time() - start_time)
+    archive.save('checkpoint/archive.csv')
 else:
-    pso = MOPSO(objective_functions=[reco_and_validate],lower_bounds=lb, upper_bounds=ub, 
-                num_iterations=args.continuing, checkpoint_dir='checkpoint')
+    if not args.continuing:
+        pso = MOPSO(objective_functions=[reco_and_validate],lower_bounds=lb, upper_bounds=ub, 
+                    num_objectives=num_objectives, num_particles=args.num_particles, num_iterations=args.num_iterations, 
+                    inertia_weight=args.inertia_weight, cognitive_coefficient=args.cognitive_coefficient,
+                    social_coefficient=args.social_coefficient,
+                    max_iter_no_improv=None, optimization_mode='global')
+        if warm_positions is not None:
+            for particle, position in zip(pso.particles, warm_positions):
+                particle.position = position
+                particle.best_position = position.copy()
+    else:
+        pso = MOPSO(objective_functions=[reco_and_validate],lower_bounds=lb, upper_bounds=ub, 
+                    num_iterations=args.continuing, checkpoint_dir='checkpoint')
+
+    # run the optimization algorithm
+    pso.optimize(history_dir='history' if args.csv_history else None, checkpoint_dir='checkpoint')
 
-# run the optimization algorithm
-pso.optimize(history_dir='history', checkpoint_dir='checkpoint')
+# bound the front MOPSO saved the same way as the archive (two objectives only)
+if not args.asynchronous and not args.time_objective and (args.archive_epsilon or args.archive_size):
+    ParetoArchive.from_csv('checkpoint/pareto_front.csv', len(lb), epsilon=args.archive_epsilon,
+                           max_size=args.archive_size).save('checkpoint/pareto_front.csv')
+
+# MOPSO keeps its front in its own coordinates to continue from it; the same front in cuts
+if args.asynchronous:
+    archive.save('checkpoint/pareto_front_cuts.csv')
+else:
+    front = read_csv('checkpoint/pareto_front.csv')
+    write_csv('checkpoint/pareto_front_cuts.csv',
+              np.hstack([search_space.to_params(front[:, :len(lb)]), front[:, len(lb):]]))
 
+if args.executor == 'daemon':
+    executor.close()
+tracer.close()
+wal.close()
@@ -3,8 +3,11 @@
 # Revision: 1.19 
 # Source: /local/reps/CMSSW/CMSSW/Configuration/Applications/python/ConfigBuilder.py,v 
 # with command line options: step3 -s RAW2DIGI:RawToDigi_pixelOnly,RECO:reconstruction_pixelTrackingOnly,VALIDATION:@pixelTrackingOnlyValidation,DQM:@pixelTrackingOnlyDQM --conditions auto:phase1_2022_realistic --datatier GEN-SIM-RECO,DQMIO -n 100 --eventcontent RECOSIM,DQM --geometry DB:Extended --era Run3 --procModifiers pixelNtupletFit,gpu --filein file:step2.root --fileout file:step3.root --nThreads 8
+import time
+configStart = time.time()
 import FWCore.ParameterSet.Config as cms
 from utils import read_csv
+from config_builder import add_particles
 
 from Configuration.Eras.Era_Run3_cff import Run3
 from Configuration.ProcessModifiers.pixelNtupletFit_cff import pixelNtupletFit
@@ -29,6 +32,36 @@ options.register('nEvents',
               VarParsing.varType.int,
               'Number of events')
 
+options.register('timesFile',
+              'temp/times.json',
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.string,
+              'Name of FastTimerService JSON summary')
+
+options.register('numThreads',
+              8,
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.int,
+              'Number of threads')
+
+options.register('configCache',
+              'cache/config',
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.string,
+              'Folder of the cached particle modules for each population size, empty to build them every time')
+
+options.register('stage',
+              'full',
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.string,
+              'full: whole chain, prepare: write the parameter-independent products to outputFile, prepared: read them from inputFiles')
+
+options.register('eventList',
+              '',
+              VarParsing.multiplicity.singleton,
+              VarParsing.varType.string,
+              'File with one run:lumi:event per line (from event_subset.py): process only the first nEvents of these events')
+
 # options.register('inputFile',
 #               'file:input/step2.root',
 #               VarParsing.multiplicity.singleton,
@@ -37,7 +70,8 @@ options.register('nEvents',
 
 options.parseArguments()
 
-process = cms.Process('RECO',Run3,pixelNtupletFit,gpu)
+# the prepared file is read back by a RECO process, which cannot share the name of a process of its input
+process = cms.Process('PREPARE' if options.stage == 'prepare' else 'RECO',Run3,pixelNtupletFit,gpu)
 
 # import of standard configurations
 process.load('Configuration.StandardSequences.Services_cff')
@@ -64,6 +98,14 @@ process.source = cms.Source('PoolSource',
     secondaryFileNames = cms.untracked.vstring()
 )
 
+# representative subset of the input instead of its first events
+if options.eventList:
+    with open(options.eventList) as f:
+        events = f.read().split()
+    if options.nEvents >= 0:
+        events = events[:options.nEvents]
+    process.source.eventsToProcess = cms.untracked.VEventRange(*events)
+
 process.options = cms.untracked.PSet(
     FailPath = cms.untracked.vstring(),
     IgnoreCompletely = cms.untracked.vstring(),
@@ -115,97 +157,16 @@ process.RandomNumberGeneratorService.restoreStateLabel=cms.untracked.string('ran
 from Configuration.AlCa.GlobalTag import GlobalTag
 process.GlobalTag = GlobalTag(process.GlobalTag, 'auto:phase1_2022_realistic', '')
 process.FastTimerService.writeJSONSummary = cms.untracked.bool(True)
-process.FastTimerService.jsonFileName = cms.untracked.string('temp/times.json')
-process.TFileService = cms.Service('TFileService', fileName=cms.string(options.outputFile) 
-                                   if cms.string(options.outputFile) else 'default.root')
+process.FastTimerService.jsonFileName = cms.untracked.string(options.timesFile)
+if options.stage != 'prepare':
+    process.TFileService = cms.Service('TFileService', fileName=cms.string(options.outputFile) 
+                                       if cms.string(options.outputFile) else 'default.root')
 
 
 # Create multiple reconstruction and validation objects with parameters in parameters.csv
 
-params = read_csv(options.parametersFile)
-totalTasks = len(params)
-for i, row in enumerate(params):
-    setattr(process, 'pixelTracksCUDA' + str(i), cms.EDProducer('CAHitNtupletCUDAPhase1',
-            CAThetaCutBarrel = cms.double(float(row[0])),
-            CAThetaCutForward = cms.double(float(row[1])),
-            dcaCutInnerTriplet = cms.double(float(row[2])),
-            dcaCutOuterTriplet = cms.double(float(row[3])),
-            hardCurvCut = cms.double(float(row[4])),
-            z0Cut = cms.double(float(row[5])),
-            phiCuts = cms.vint32(
-                int(row[6]), int(row[7]), int(row[8]), int(row[9]), int(row[10]),
-                int(row[11]), int(row[12]), int(row[13]), int(row[14]), int(row[15]),
-                int(row[16]), int(row[17]), int(row[18]), int(row[19]), int(row[20]),
-                int(row[21]), int(row[22]), int(row[23]), int(row[24])
-            ),
-            doClusterCut = cms.bool(True),
-            doPtCut = cms.bool(True),
-            doSharedHitCut = cms.bool(True),
-            doZ0Cut = cms.bool(True),
-            dupPassThrough = cms.bool(False),
-            earlyFishbone = cms.bool(True),
-            fillStatistics = cms.bool(False),
-            fitNas4 = cms.bool(False),
-            idealConditions = cms.bool(True),
-            includeJumpingForwardDoublets = cms.bool(False),
-            lateFishbone = cms.bool(False),
-            maxNumberOfDoublets = cms.uint32(524288),
-            mightGet = cms.optional.untracked.vstring,
-            minHitsForSharingCut = cms.uint32(10),
-            minHitsPerNtuplet = cms.uint32(4),
-            onGPU = cms.bool(True),
-            pixelRecHitSrc = cms.InputTag('siPixelRecHitsPreSplittingCUDA'),
-            ptCut = cms.double(0.5),
-            ptmin = cms.double(0.8999999761581421),
-            trackQualityCuts = cms.PSet(
-                chi2Coeff = cms.vdouble(0.9, 1.8),
-                chi2MaxPt = cms.double(10),
-                chi2Scale = cms.double(8),
-                quadrupletMaxTip = cms.double(0.5),
-                quadrupletMaxZip = cms.double(12),
-                quadrupletMinPt = cms.double(0.3),
-                tripletMaxTip = cms.double(0.3),
-                tripletMaxZip = cms.double(12),
-                tripletMinPt = cms.double(0.5)
-            ),
-            useRiemannFit = cms.bool(False),
-            useSimpleTripletCleaner = cms.bool(True)
-        )
-    )
-    setattr(process, 'pixelTracksSoA' + str(i), cms.EDProducer('PixelTrackSoAFromCUDAPhase1',
-            mightGet = cms.optional.untracked.vstring,
-            src = cms.InputTag('pixelTracksCUDA' + str(i)))
-    )
-    setattr(process, 'pixelTracks' + str(i), cms.EDProducer('PixelTrackProducerFromSoAPhase1',
-            beamSpot = cms.InputTag('offlineBeamSpot'),
-            mightGet = cms.optional.untracked.vstring,
-            minNumberOfHits = cms.int32(0),
-            minQuality = cms.string('loose'),
-            pixelRecHitLegacySrc = cms.InputTag('siPixelRecHitsPreSplitting'),
-            trackSrc = cms.InputTag('pixelTracksSoA' + str(i))
-        )
-    )
-    setattr(process, 'simpleValidation' + str(i), cms.EDAnalyzer('SimpleValidation',
-            chargedOnlyTP = cms.bool(True),
-            intimeOnlyTP = cms.bool(False),
-            invertRapidityCutTP = cms.bool(False),
-            lipTP = cms.double(30.0),
-            maxPhi = cms.double(3.2),
-            maxRapidityTP = cms.double(2.5),
-            minHitTP = cms.int32(0),
-            minPhi = cms.double(-3.2),
-            minRapidityTP = cms.double(-2.5),
-            pdgIdTP = cms.vint32(),
-            ptMaxTP = cms.double(1e+100),
-            ptMinTP = cms.double(0.9),
-            signalOnlyTP = cms.bool(True),
-            stableOnlyTP = cms.bool(False),
-            tipTP = cms.double(3.5),
-            trackLabels = cms.VInputTag('pixelTracks' + str(i)),
-            trackAssociator = cms.untracked.InputTag('quickTrackAssociatorByHits'),
-            trackingParticles = cms.InputTag('mix', 'MergedTrackTruth')               
-        )
-    )
+params = read_csv(options.parametersFile) if options.stage != 'prepare' else []
+add_particles(process, params, 1, cache_dir=options.configCache)
 
 # Prevalidation
 process.tpClusterProducer = cms.EDProducer('ClusterTPAssociationProducer',
@@ -233,44 +194,69 @@ process.quickTrackAssociatorByHits = cms.EDProducer('QuickTrackAssociatorByHitsP
     useClusterTPAssociation = cms.bool(True)
 )
 
-# Lists of tasks
-taskListCUDA = [getattr(process, 'pixelTracksCUDA'+str(i)) for i in range(totalTasks)]
-taskListSoA = [getattr(process, 'pixelTracksSoA'+str(i)) for i in range(totalTasks)]
-taskList = [getattr(process, 'pixelTracks'+str(i)) for i in range(totalTasks)]
-taskListVal = [getattr(process, 'simpleValidation'+str(i)) for i in range(totalTasks)]
-
-# Tasks and sequences
-process.pixelTracksTask = cms.Task(*taskListCUDA, *taskListSoA, *taskList)
-process.pixelTracksSeq = cms.Sequence(process.pixelTracksTask)
+# Sequences
 process.preValidation = cms.Sequence(process.tpClusterProducer + process.quickTrackAssociatorByHits)
-process.simpleValSeq = cms.Sequence(sum(taskListVal[1:],taskListVal[0]))
 process.consumer = cms.EDAnalyzer('GenericConsumer', eventProducts = cms.untracked.vstring('tracksValidation'))
 
 
 # Path and EndPath definitions
 process.raw2digi_step = cms.Path(process.RawToDigi_pixelOnly)
 process.reconstruction_step = cms.Path(process.reconstruction_pixelTrackingOnly)
-process.pixel_tracks_step = cms.Path(process.pixelTracksTask)
-process.pre_validation_step = cms.Path(process.preValidation)
-process.validation_step = cms.Path(process.simpleValSeq)
-process.consume_step = cms.EndPath(process.consumer)
-
-
-# Schedule definition
-process.schedule = cms.Schedule(
-    process.raw2digi_step,
-    process.reconstruction_step,
-    process.pixel_tracks_step,
-    process.pre_validation_step,
-    process.validation_step,
-    process.consume_step
+
+if options.stage == 'prepare':
+    # Write the products that are the same for every set of cuts, to be read back with stage=prepared
+    process.pre_validation_step = cms.Path(process.tpClusterProducer)
+    process.preparedOutput = cms.OutputModule('PoolOutputModule',
+        fileName = cms.untracked.string(options.outputFile),
+        outputCommands = cms.untracked.vstring(
+            'drop *',
+            'keep FEDRawDataCollection_rawDataCollector_*_*',
+            'keep *_offlineBeamSpot_*_*',
+            'keep *_siPixelClustersPreSplitting_*_*',
+            'keep *_tpClusterProducer_*_*',
+            'keep *_mix_MergedTrackTruth_*'
+        ),
+        compressionAlgorithm = cms.untracked.string('LZ4'),
+        compressionLevel = cms.untracked.int32(4)
     )
+    process.prepare_step = cms.EndPath(process.preparedOutput)
+
+    # Schedule definition
+    process.schedule = cms.Schedule(
+        process.raw2digi_step,
+        process.reconstruction_step,
+        process.pre_validation_step,
+        process.prepare_step
+        )
+else:
+    if options.stage == 'prepared':
+        # The beamspot, the legacy clusters and their association to TrackingParticles come from the input;
+        # neither the raw-to-digi nor the pixel reconstruction paths are scheduled, only the producers of the
+        # rechits the CA and the track conversion consume run, unscheduled, from a task
+        del process.offlineBeamSpot
+        del process.siPixelClustersPreSplitting
+        process.preValidation = cms.Sequence(process.quickTrackAssociatorByHits)
+        process.pixelRecHitsTask = cms.Task(process.offlineBeamSpotToCUDA, process.siPixelClustersPreSplittingCUDA,
+                                            process.siPixelRecHitsPreSplittingCUDA, process.siPixelRecHitsPreSplitting)
+        process.pixel_tracks_step = cms.Path(process.pixelTracksTask, process.pixelRecHitsTask)
+    else:
+        process.pixel_tracks_step = cms.Path(process.pixelTracksTask)
+
+    process.pre_validation_step = cms.Path(process.preValidation)
+    process.validation_step = cms.Path(process.simpleValSeq)
+    process.consume_step = cms.EndPath(process.consumer)
+
+    # Schedule definition
+    steps = [process.pixel_tracks_step, process.pre_validation_step, process.validation_step, process.consume_step]
+    if options.stage != 'prepared':
+        steps = [process.raw2digi_step, process.reconstruction_step] + steps
+    process.schedule = cms.Schedule(*steps)
 
 from PhysicsTools.PatAlgos.tools.helpers import associatePatAlgosToolsTask
 associatePatAlgosToolsTask(process)
 
 #Setup FWK for multithreaded
-process.options.numberOfThreads = 8
+process.options.numberOfThreads = options.numThreads
 process.options.numberOfStreams = 0
 
 # customisation of the process.
@@ -294,3 +280,8 @@ process = customiseLogErrorHarvesterUsingOutputCommands(process)
 from Configuration.StandardSequences.earlyDeleteSettings_cff import customiseEarlyDelete
 process = customiseEarlyDelete(process)
 # End adding early deletion
+
+# the modules of the paths and of their tasks, to compare the stages (stage=prepared against full)
+print('%d modules scheduled' % len(process.schedule.moduleNames()))
+# read back by timing.py to split the cmsRun wall time
+print('config built in %.3f s' % (time.time() - configStart))
@@ -0,0 +1,166 @@
+import argparse
+import os
+import time
+import numpy as np
+from executor import Quarantine
+from search_space import space
+from store import EvaluationStore
+from timing import Tracer
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# number of simulated tracks of the counters made up from a replayed fitness
+REPLAY_SIM = 1e6
+
+# the cuts in the coordinates of the search space (log scale where it says so), every dimension scaled to [0, 1]
+# whether it is frozen or not, so that distances weigh all the cuts alike
+def normalized(search_space, params):
+    params = np.asarray(params, dtype=float).reshape(-1, len(search_space))
+    columns = []
+    for i, dimension in enumerate(search_space.dimensions):
+        low, high = dimension.bounds()
+        columns.append((dimension.to_coordinates(params[:, i]) - low) / (high - low))
+    return np.column_stack(columns)
+
+# cuts, objectives and CA time of the real evaluations of history stores, at the largest number of events of each store
+def recorded(directories):
+    params, fitness, times = [], [], []
+    for directory in directories:
+        store = EvaluationStore(directory)
+        if not os.path.exists(store.meta_file):
+            raise ValueError(directory + ' is not a history store, it has no meta.json')
+        if not len(store):
+            raise ValueError(directory + ' is an empty history store')
+        columns = store.load('params', 'fitness', 'time', 'predicted', 'num_events')
+        real = (columns['predicted'] == 0) & np.all(np.isfinite(columns['fitness'][:, :2]), axis=1)
+        if real.any():
+            real &= columns['num_events'] == columns['num_events'][real].max()
+        # copies: the store of the run may be reset while the index is in use
+        params.append(np.array(columns['params'][real]))
+        fitness.append(np.array(columns['fitness'][real, :2]))
+        times.append(np.array(columns['time'][real]))
+    return np.vstack(params), np.vstack(fitness), np.concatenate(times)
+
+# nearest-neighbour index of recorded real evaluations: a query gets the inverse-distance weighted average of the
+# objectives of its num_neighbours nearest samples, and the distance to the nearest one tells how far it is from
+# anything that was really run (0 on a sample, about 1 across the whole range of one cut)
+class ReplayIndex:
+    def __init__(self, params, fitness, times, search_space, num_neighbours=8, power=2):
+        self.search_space = search_space
+        self.points = normalized(search_space, params)
+        self.fitness = np.asarray(fitness, dtype=float)
+        self.times = np.asarray(times, dtype=float)
+        self.num_neighbours = min(num_neighbours, len(self.points))
+        self.power = power
+        if not len(self.points):
+            raise ValueError('no recorded evaluation to replay')
+        self.tree = cKDTree(self.points) if cKDTree is not None else None
+
+    @classmethod
+    def from_stores(cls, directories, search_space, num_neighbours=8, power=2):
+        return cls(*recorded(directories), search_space, num_neighbours, power)
+
+    def __len__(self):
+        return len(self.points)
+
+    # distances to and indices of the nearest samples, with a KD-tree when scipy is there, else by brute force
+    def neighbours(self, points):
+        if self.tree is not None:
+            distances, indices = self.tree.query(points, k=self.num_neighbours)
+            return distances.reshape(len(points), -1), indices.reshape(len(points), -1)
+        distances = np.empty((len(points), self.num_neighbours))
+        indices = np.empty((len(points), self.num_neighbours), dtype=int)
+        norms = np.sum(self.points ** 2, axis=1)
+        # chunks of queries keep the distance matrix within a few tens of MB
+        chunk = max(1, int(2e6 // len(self.points)))
+        for start in range(0, len(points), chunk):
+            block = points[start:start + chunk]
+            squared = np.maximum(np.sum(block ** 2, axis=1)[:, None] + norms[None, :] - 2 * block @ self.points.T, 0)
+            nearest = np.argpartition(squared, self.num_neighbours - 1, axis=1)[:, :self.num_neighbours]
+            order = np.argsort(np.take_along_axis(squared, nearest, axis=1), axis=1)
+            indices[start:start + chunk] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + chunk] = np.sqrt(np.take_along_axis(squared, indices[start:start + chunk], axis=1))
+        return distances, indices
+
+    # objectives, CA time (NaN when no neighbour has one) and distance to the nearest sample of every row of cuts
+    def query(self, params):
+        distances, indices = self.neighbours(normalized(self.search_space, params))
+        weights = 1 / np.maximum(distances, 1e-12) ** self.power
+        # on a sample: that sample only
+        exact = distances[:, 0] < 1e-12
+        weights[exact] = 0
+        weights[exact, 0] = 1
+        fitness = np.einsum('qk,qko->qo', weights, self.fitness[indices]) / weights.sum(axis=1)[:, None]
+        times = self.times[indices]
+        known = np.isfinite(times)
+        time_weights = np.where(known, weights, 0)
+        with np.errstate(invalid='ignore'):
+            times = np.sum(time_weights * np.nan_to_num(times), axis=1) / time_weights.sum(axis=1)
+        return fitness, times, distances[:, 0]
+
+# counters that give back a fitness through compute_metrics, followed by the time
+def counters_from_fitness(fitness, times):
+    total_ass_sim = (1 - fitness[:, 0]) * REPLAY_SIM
+    total_rec = total_ass_sim / np.maximum(1 - fitness[:, 1], 1e-12)
+    return np.column_stack([total_rec, total_ass_sim, total_ass_sim, np.zeros(len(fitness)),
+                            np.full(len(fitness), REPLAY_SIM), times])
+
+# executor answering from recorded evaluations instead of running cmsRun, to try optimizer settings in seconds;
+# the distance of every query to the nearest real sample is appended to distance_file and summarized
+class ReplayExecutor:
+    def __init__(self, index, tracer=None, quarantine=None, distance_file=None):
+        self.index = index
+        self.tracer = tracer or Tracer()
+        self.quarantine = quarantine if quarantine is not None else Quarantine()
+        self.distance_file = distance_file
+        self.distances = []
+
+    def evaluate(self, params, num_events=None):
+        if not len(params):
+            return []
+        start = time.time()
+        fitness, times, distances = self.index.query(params)
+        self.tracer.record('replay', start, time.time() - start, rows=len(params),
+                           median_distance=float(np.median(distances)), max_distance=float(distances.max()))
+        self.distances.extend(distances.tolist())
+        print('replay: %d rows, distance to the nearest real sample: median %.4f, 90%% %.4f, max %.4f'
+              % (len(params), np.median(distances), np.percentile(distances, 90), distances.max()))
+        if self.distance_file:
+            directory = os.path.dirname(self.distance_file)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.distance_file, 'a') as f:
+                for row_fitness, distance in zip(fitness, distances):
+                    f.write('%.18f,%.18f,%.18f\n' % (*row_fitness, distance))
+        return list(counters_from_fitness(fitness, times))
+
+# error of the replay on recorded evaluations left out of the index, against the distance to the nearest sample
+def check(directories, phase, fraction, num_neighbours):
+    params, fitness, times = recorded(directories)
+    held_out = np.random.rand(len(params)) < fraction
+    if not held_out.any() or held_out.all():
+        raise ValueError('%d samples, nothing to check with a fraction of %g' % (len(params), fraction))
+    index = ReplayIndex(params[~held_out], fitness[~held_out], times[~held_out], space(phase), num_neighbours)
+    predicted, _, nearest = index.query(params[held_out])
+    error = np.abs(predicted - fitness[held_out])
+    print('%d samples, %d left out' % (len(params), held_out.sum()))
+    print('%-24s %8s %18s %14s' % ('nearest distance', 'queries', 'MAE 1 - efficiency', 'MAE fake rate'))
+    edges = np.quantile(nearest, [0, 0.25, 0.5, 0.75, 1])
+    bins = np.clip(np.searchsorted(edges, nearest, side='right') - 1, 0, len(edges) - 2)
+    for i, (low, high) in enumerate(zip(edges[:-1], edges[1:])):
+        selected = bins == i
+        print('%-24s %8d %18.5f %14.5f' % ('%.4f - %.4f' % (low, high), selected.sum(), *error[selected].mean(axis=0)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['check'])
+    parser.add_argument('stores', nargs='+')
+    parser.add_argument('-p2', '--phase2', action='store_true')
+    parser.add_argument('--fraction', default=0.1, type=float, action='store')
+    parser.add_argument('-k', '--num_neighbours', default=8, type=int, action='store')
+    args = parser.parse_args()
+
+    check(args.stores, 2 if args.phase2 else 1, args.fraction, args.num_neighbours)
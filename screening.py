@@ -0,0 +1,86 @@
+import argparse
+import json
+import numpy as np
+from utils import atomic_open
+
+OBJECTIVE_NAMES = ['1 - efficiency', 'fake rate', 'CA time']
+
+# Morris design in the unit cube: each trajectory starts from a random point of a grid with num_levels levels
+# and moves one dimension at a time, in random order, by delta, so that num_trajectories * (num_dimensions + 1)
+# points give num_trajectories elementary effects per dimension; returns the points and, for each step,
+# the dimension that moved and by how much
+def morris_design(num_dimensions, num_trajectories, num_levels=4):
+    delta = num_levels / (2.0 * (num_levels - 1))
+    grid = np.arange(num_levels) / (num_levels - 1.0)
+    points, steps = [], []
+    for _ in range(num_trajectories):
+        point = np.random.choice(grid, num_dimensions)
+        points.append(point.copy())
+        for dimension in np.random.permutation(num_dimensions):
+            step = delta if point[dimension] + delta <= 1 else -delta
+            point[dimension] += step
+            points.append(point.copy())
+            steps.append((dimension, step))
+    return np.array(points).reshape(-1, num_dimensions), steps
+
+# mean absolute elementary effect (mu*) and standard deviation of the effects (sigma) of every dimension
+# on every objective, the objectives scaled by their spread over the design so that they can be compared;
+# the trajectories with a failed point (flagged in failed, e.g. a crashed cmsRun given the penalty, or non-finite)
+# are left out whole, a penalty is not an effect of the cuts
+def morris_effects(fitness, steps, num_dimensions, failed=None):
+    fitness = np.asarray(fitness, dtype=float)
+    finite = np.all(np.isfinite(fitness), axis=1)
+    if failed is not None:
+        finite &= ~np.asarray(failed, dtype=bool)
+    trajectories = finite.reshape(-1, num_dimensions + 1).all(axis=1)
+    finite = np.repeat(trajectories, num_dimensions + 1)
+    spread = np.maximum(np.std(fitness[finite], axis=0), 1e-12) if finite.any() else np.ones(fitness.shape[1])
+    effects = [[] for _ in range(num_dimensions)]
+    for k, (dimension, step) in enumerate(steps):
+        # the point before the k-th step: trajectories have num_dimensions steps and num_dimensions + 1 points
+        before = k // num_dimensions * (num_dimensions + 1) + k % num_dimensions
+        if finite[before] and finite[before + 1]:
+            effects[dimension].append((fitness[before + 1] - fitness[before]) / spread / step)
+    mu_star = np.full((num_dimensions, fitness.shape[1]), np.nan)
+    sigma = np.full((num_dimensions, fitness.shape[1]), np.nan)
+    for dimension, values in enumerate(effects):
+        if values:
+            mu_star[dimension] = np.mean(np.abs(values), axis=0)
+            sigma[dimension] = np.std(values, axis=0)
+    return mu_star, sigma
+
+# the free dimensions ranked by influence, the largest mu* over the objectives, most influential first
+def ranking(names, mu_star, sigma, num_evaluations):
+    influence = np.nanmax(np.nan_to_num(mu_star, nan=-np.inf), axis=1)
+    order = np.argsort(-influence, kind='stable')
+    return {'num_evaluations': int(num_evaluations),
+            'dimensions': [{'name': names[i], 'influence': float(influence[i]), 'mu_star': mu_star[i].tolist(),
+                            'sigma': sigma[i].tolist()} for i in order]}
+
+def save_report(filename, report):
+    with atomic_open(filename) as f:
+        json.dump(report, f, indent=4)
+
+def load_report(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+# names of the num_weakest least influential dimensions of a report
+def weakest(report, num_weakest):
+    return [dimension['name'] for dimension in report['dimensions'][::-1][:num_weakest]]
+
+def print_report(report):
+    num_objectives = len(report['dimensions'][0]['mu_star']) if report['dimensions'] else 0
+    print('%-20s %10s' % ('name', 'influence')
+          + ''.join(' %16s %16s' % ('mu* ' + name, 'sigma ' + name) for name in OBJECTIVE_NAMES[:num_objectives]))
+    for dimension in report['dimensions']:
+        print('%-20s %10.4f' % (dimension['name'], dimension['influence'])
+              + ''.join(' %16.4f %16.4f' % values for values in zip(dimension['mu_star'], dimension['sigma'])))
+    print('%d dimensions ranked with %d evaluations' % (len(report['dimensions']), report['num_evaluations']))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('report', nargs='?', default='checkpoint/screening.json')
+    args = parser.parse_args()
+
+    print_report(load_report(args.report))
@@ -0,0 +1,180 @@
+import argparse
+import fnmatch
+import json
+import re
+import numpy as np
+from utils import atomic_open
+
+phi0p05 = 522
+phi0p06 = 626
+phi0p07 = 730
+phi0p09 = 900
+
+# one cut of the CA: its type (int or float), scale (linear or log), bounds and default value;
+# a frozen dimension keeps its default value and is not seen by the optimizer
+class Dimension:
+    def __init__(self, name, low, high, default, type='float', scale='linear', frozen=False):
+        if type not in ('int', 'float') or scale not in ('linear', 'log'):
+            raise ValueError(name + ': unknown type or scale')
+        if scale == 'log' and (low <= 0 or type == 'int'):
+            raise ValueError(name + ': a log scale needs a float dimension with a positive lower bound')
+        self.name = name
+        self.low = low
+        self.high = high
+        self.default = default
+        self.type = type
+        self.scale = scale
+        self.frozen = frozen
+
+    # bounds in the optimizer's coordinates; each integer gets an interval of the same width
+    def bounds(self):
+        if self.scale == 'log':
+            return float(np.log10(self.low)), float(np.log10(self.high))
+        if self.type == 'int':
+            return self.low - 0.5, self.high + 0.5
+        return float(self.low), float(self.high)
+
+    # from the optimizer's coordinates to values of the cut
+    def to_values(self, coordinates):
+        values = 10 ** np.asarray(coordinates, dtype=float) if self.scale == 'log' else np.asarray(coordinates, dtype=float)
+        if self.type == 'int':
+            values = np.rint(values)
+        return np.clip(values, self.low, self.high)
+
+    def to_coordinates(self, values):
+        values = np.asarray(values, dtype=float)
+        return np.log10(values) if self.scale == 'log' else values
+
+    def to_dict(self):
+        return {'name': self.name, 'low': self.low, 'high': self.high, 'default': self.default, 'type': self.type,
+                'scale': self.scale, 'frozen': self.frozen}
+
+# the cuts in the order of the columns of parameters.csv; the optimizer only sees the free dimensions,
+# in their own coordinates, and to_params turns its positions into rows of cuts
+class SearchSpace:
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+
+    def __len__(self):
+        return len(self.dimensions)
+
+    @property
+    def names(self):
+        return [dimension.name for dimension in self.dimensions]
+
+    @property
+    def free(self):
+        return [i for i, dimension in enumerate(self.dimensions) if not dimension.frozen]
+
+    @property
+    def lower_bounds(self):
+        return [self.dimensions[i].bounds()[0] for i in self.free]
+
+    @property
+    def upper_bounds(self):
+        return [self.dimensions[i].bounds()[1] for i in self.free]
+
+    @property
+    def defaults(self):
+        return [dimension.default for dimension in self.dimensions]
+
+    # positions of the optimizer, one row per particle, to full rows of cuts
+    def to_params(self, positions):
+        positions = np.asarray(positions, dtype=float).reshape(-1, len(self.free))
+        params = np.tile(np.asarray(self.defaults, dtype=float), (len(positions), 1))
+        for k, i in enumerate(self.free):
+            params[:, i] = self.dimensions[i].to_values(positions[:, k])
+        return params
+
+    # full rows of cuts to positions of the optimizer
+    def from_params(self, params):
+        params = np.asarray(params, dtype=float).reshape(-1, len(self))
+        return np.column_stack([self.dimensions[i].to_coordinates(params[:, i]) for i in self.free]) \
+            if self.free else np.empty((len(params), 0))
+
+    # the parameters of the CA module for one row of cuts; numbered dimensions (phiCuts0, phiCuts1, ...)
+    # are gathered in one list
+    def parameter_values(self, row):
+        values = {}
+        for dimension, value in zip(self.dimensions, row):
+            value = int(value) if dimension.type == 'int' else float(value)
+            match = re.match(r'^(.*?)(\d+)$', dimension.name)
+            if match:
+                values.setdefault(match.group(1), []).append(value)
+            else:
+                values[dimension.name] = value
+        return values
+
+    # freeze (or free) the dimensions whose name matches one of the shell-style patterns
+    def freeze(self, patterns, frozen=True):
+        matched = [dimension for dimension in self.dimensions
+                   if any(fnmatch.fnmatchcase(dimension.name, pattern) for pattern in patterns)]
+        if patterns and not matched:
+            raise ValueError('no dimension matches ' + ' '.join(patterns))
+        for dimension in matched:
+            dimension.frozen = frozen
+        return self
+
+    def save(self, filename):
+        with atomic_open(filename) as f:
+            json.dump([dimension.to_dict() for dimension in self.dimensions], f, indent=4)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            return cls([Dimension(**dimension) for dimension in json.load(f)])
+
+    def summary(self):
+        lines = ['%-20s %-6s %-7s %12s %12s %12s %s' % ('name', 'type', 'scale', 'low', 'high', 'default', '')]
+        for dimension in self.dimensions:
+            lines.append('%-20s %-6s %-7s %12.6g %12.6g %12.6g %s'
+                         % (dimension.name, dimension.type, dimension.scale, dimension.low, dimension.high,
+                            dimension.default, 'frozen' if dimension.frozen else ''))
+        lines.append('%d of %d dimensions free' % (len(self.free), len(self)))
+        return '\n'.join(lines)
+
+# the cuts common to both phases: the theta cuts and the curvature cut span orders of magnitude and are searched
+# in log scale (the theta cuts from 1e-4, a zero cut keeps nothing), the phiCuts are integers
+def common_dimensions(z0_default):
+    return [Dimension('CAThetaCutBarrel', 1e-4, 0.006, 0.0020000000949949026, scale='log'),
+            Dimension('CAThetaCutForward', 1e-4, 0.03, 0.003000000026077032, scale='log'),
+            Dimension('dcaCutInnerTriplet', 0.0, 0.2, 0.15000000596046448),
+            Dimension('dcaCutOuterTriplet', 0.0, 1.0, 0.25),
+            Dimension('hardCurvCut', 1.0 / 3.8 / 0.9, 1.0 / 3.8 / 0.3, 0.03284072249589491, scale='log'),
+            Dimension('z0Cut', 5.0, 20.0, z0_default)]
+
+def phi_dimensions(defaults):
+    return [Dimension('phiCuts' + str(i), 400, 1000, default, type='int') for i, default in enumerate(defaults)]
+
+# the search space of the CA cuts of each phase, with the defaults currently set in CMSSW
+def space(phase):
+    if phase == 2:
+        return SearchSpace(common_dimensions(7.5) + phi_dimensions([
+            phi0p05, phi0p05, phi0p05, phi0p06, phi0p07, phi0p07, phi0p06, phi0p07, phi0p07, phi0p05, phi0p05,
+            phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05,
+            phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p07, phi0p07, phi0p07, phi0p07,
+            phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07, phi0p07,
+            phi0p07, phi0p07, phi0p07, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05]))
+    return SearchSpace(common_dimensions(12.0) + phi_dimensions([
+        phi0p05, phi0p07, phi0p07, phi0p05, phi0p06, phi0p06, phi0p05, phi0p05, phi0p06,
+        phi0p06, phi0p06, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05, phi0p05]))
+
+# the space of the runs checkpointed before search_space.json was written: every cut searched on its own values,
+# within the bounds of that time (the theta cuts from 0), so that their saved positions keep their meaning
+def legacy_space(phase):
+    search_space = space(phase)
+    for dimension in search_space.dimensions:
+        dimension.scale = 'linear'
+        if dimension.name.startswith('CAThetaCut'):
+            dimension.low = 0.0
+    return search_space
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p2', '--phase2', action='store_true')
+    parser.add_argument('--freeze', nargs='*', default=[])
+    parser.add_argument('-l', '--load', action='store')
+    args = parser.parse_args()
+
+    search_space = SearchSpace.load(args.load) if args.load else space(2 if args.phase2 else 1)
+    print(search_space.freeze(args.freeze).summary())
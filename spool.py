@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import numpy as np
+from stand_in import analytic_counters
+from executor import EvaluationError, Quarantine, ShardedExecutor, isolate, skip_quarantined
+from timing import Tracer
+
+# job spool on a shared filesystem: the optimizer writes jobs to pending/, a worker claims one by
+# renaming it to claimed/ (atomic, so only one worker gets it), keeps touching it while it runs,
+# and writes the counters to done/. Claims that have not been touched for lease_timeout seconds
+# belong to a dead worker and are moved back to pending/.
+SUBDIRECTORIES = ['pending', 'claimed', 'done']
+
+def make_spool(spool_dir):
+    for subdirectory in SUBDIRECTORIES:
+        os.makedirs(os.path.join(spool_dir, subdirectory), exist_ok=True)
+
+# write a JSON file so that readers never see it half written
+def write_json(filename, content):
+    temp_file = os.path.join(os.path.dirname(os.path.dirname(filename)),
+                             '.' + os.path.basename(filename) + '.' + uuid.uuid4().hex)
+    with open(temp_file, 'w') as f:
+        json.dump(content, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(temp_file, filename)
+
+# move expired claims back to pending
+def requeue_expired(spool_dir, lease_timeout):
+    claimed_dir = os.path.join(spool_dir, 'claimed')
+    for name in os.listdir(claimed_dir):
+        try:
+            if time.time() - os.path.getmtime(os.path.join(claimed_dir, name)) > lease_timeout:
+                os.rename(os.path.join(claimed_dir, name), os.path.join(spool_dir, 'pending', name))
+                print('requeued expired job', name, flush=True)
+        except FileNotFoundError:
+            pass
+
+# optimizer side: split each batch into jobs and wait for the workers' results
+class SpoolExecutor:
+    def __init__(self, spool_dir, config, input_file, num_events, num_shards=1, num_threads=None, options=(),
+                 backend='cmssw', lease_timeout=600, poll_interval=1.0, tracer=None, quarantine=None, retries=1,
+                 on_batch=None, known_good=None):
+        self.spool_dir = spool_dir
+        self.tracer = tracer or Tracer()
+        self.quarantine = quarantine if quarantine is not None else Quarantine()
+        self.job = {'config': os.path.abspath(config), 'input_file': os.path.abspath(input_file),
+                    'num_threads': num_threads, 'options': list(options), 'backend': backend, 'retries': retries,
+                    'known_good': None if known_good is None else [float(value) for value in known_good]}
+        self.retries = retries
+        self.known_good = known_good
+        self.num_events = num_events
+        self.num_shards = num_shards
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        self.on_batch = on_batch
+        make_spool(spool_dir)
+
+    def evaluate(self, params, num_events=None):
+        return skip_quarantined(params, self.quarantine, lambda rows: self.evaluate_rows(rows, num_events))
+
+    # write a job with these rows to pending/, its id sorts in submission order
+    def submit(self, params, num_events):
+        id = '%.6f-%s' % (time.time(), uuid.uuid4().hex)
+        write_json(os.path.join(self.spool_dir, 'pending', id + '.json'),
+                   {**self.job, 'id': id, 'params': np.asarray(params).tolist(), 'num_events': num_events})
+        return id
+
+    # the counters of a finished job, None while it is not done; a job that failed raises EvaluationError
+    def collect(self, id, start):
+        done_file = os.path.join(self.spool_dir, 'done', id + '.json')
+        if not os.path.exists(done_file):
+            return None
+        with open(done_file) as f:
+            result = json.load(f)
+        os.remove(done_file)
+        if 'error' in result:
+            raise EvaluationError('spool job ' + id + ' failed on ' + result['worker'] + ': ' + result['error'])
+        # from submission to the result being seen, so it includes the time in the queue
+        self.tracer.record('spool_job', start, time.time() - start, job=id, worker=result['worker'])
+        # rows the worker had to isolate
+        for entry in result.get('quarantined', []):
+            self.quarantine.add(entry['params'], entry['reason'] + ' (on ' + result['worker'] + ')')
+        return result['counters']
+
+    # one job and its result, to isolate the rows of a job that failed
+    def run(self, params, num_events):
+        start = time.time()
+        id = self.submit(params, num_events)
+        while True:
+            time.sleep(self.poll_interval)
+            requeue_expired(self.spool_dir, self.lease_timeout)
+            counters = self.collect(id, start)
+            if counters is not None:
+                return counters
+
+    # withdraw jobs: the pending ones are not claimed any more, and a worker running one of the others
+    # finds its claim gone and drops the result
+    def cancel(self, ids):
+        for id in ids:
+            for subdirectory in SUBDIRECTORIES:
+                try:
+                    os.remove(os.path.join(self.spool_dir, subdirectory, id + '.json'))
+                except FileNotFoundError:
+                    pass
+
+    # one job per shard; a job that fails is retried, then split like a failed cmsRun (see isolate),
+    # and the other jobs are withdrawn when the batch cannot be completed
+    def evaluate_rows(self, params, num_events=None):
+        if not len(params):
+            return []
+        num_events = num_events or self.num_events
+        shards = np.array_split(np.asarray(params, dtype=float), min(self.num_shards, len(params)))
+        start = time.time()
+        ids = [self.submit(shard, num_events) for shard in shards]
+        results = {}
+        try:
+            while len(results) < len(ids):
+                time.sleep(self.poll_interval)
+                requeue_expired(self.spool_dir, self.lease_timeout)
+                for k, id in enumerate(ids):
+                    if k in results:
+                        continue
+                    try:
+                        counters = self.collect(id, start)
+                    except EvaluationError as e:
+                        print('batch of %d rows failed: %s' % (len(shards[k]), e), flush=True)
+                        counters = isolate(shards[k], lambda rows: self.run(rows, num_events), self.retries,
+                                           self.quarantine, e, self.known_good)
+                    if counters is None:
+                        continue
+                    results[k] = counters
+                    if self.on_batch is not None:
+                        self.on_batch(shards[k], counters, num_events)
+        except Exception:
+            self.cancel([id for k, id in enumerate(ids) if k not in results])
+            raise
+        counters = []
+        for k in range(len(ids)):
+            counters.extend(results[k])
+        return counters
+
+# worker side: claim the oldest pending job, evaluate it and write the result back
+class SpoolWorker:
+    def __init__(self, spool_dir, work_dir, lease_timeout=600):
+        self.spool_dir = spool_dir
+        self.name = socket.gethostname() + ':' + str(os.getpid())
+        self.work_dir = work_dir
+        self.lease_timeout = lease_timeout
+        make_spool(spool_dir)
+
+    def claim(self):
+        pending_dir = os.path.join(self.spool_dir, 'pending')
+        for name in sorted(os.listdir(pending_dir)):
+            claimed_file = os.path.join(self.spool_dir, 'claimed', name)
+            try:
+                # start the lease before the job shows up in claimed/
+                os.utime(os.path.join(pending_dir, name))
+                os.rename(os.path.join(pending_dir, name), claimed_file)
+                with open(claimed_file) as f:
+                    return claimed_file, json.load(f)
+            except FileNotFoundError:
+                continue
+        return None, None
+
+    # touch the claim until the job is done, so that it is not requeued
+    def heartbeat(self, claimed_file, finished):
+        while not finished.wait(self.lease_timeout / 4):
+            try:
+                os.utime(claimed_file)
+            except FileNotFoundError:
+                return
+
+    # the counters of a job and the rows that had to be quarantined
+    def run_job(self, job):
+        if job['backend'] == 'stub':
+            return [analytic_counters(row, job['num_events']) for row in job['params']], []
+        executor = ShardedExecutor(job['config'], job['input_file'], job['num_events'], num_threads=job['num_threads'],
+                                   work_dir=self.work_dir, options=job['options'], retries=job.get('retries', 1),
+                                   known_good=job.get('known_good'))
+        counters = [[float(value) for value in row] for row in executor.evaluate(job['params'])]
+        return counters, list(executor.quarantine.entries.values())
+
+    # process jobs until there has been nothing to do for idle_exit seconds (forever if None)
+    def run(self, idle_exit=None, poll_interval=1.0):
+        idle_since = time.time()
+        while idle_exit is None or time.time() - idle_since < idle_exit:
+            requeue_expired(self.spool_dir, self.lease_timeout)
+            claimed_file, job = self.claim()
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            print(self.name, 'running job', job['id'], 'with', len(job['params']), 'particles', flush=True)
+            finished = threading.Event()
+            threading.Thread(target=self.heartbeat, args=(claimed_file, finished), daemon=True).start()
+            try:
+                counters, quarantined = self.run_job(job)
+                result = {'counters': counters, 'quarantined': quarantined}
+            except Exception as e:
+                result = {'error': repr(e)}
+            result['worker'] = self.name
+            finished.set()
+            idle_since = time.time()
+            if not os.path.exists(claimed_file):
+                # withdrawn by the optimizer, or requeued after the lease expired and run by another worker
+                print(self.name, 'dropped the result of job', job['id'], 'whose claim is gone', flush=True)
+                continue
+            write_json(os.path.join(self.spool_dir, 'done', job['id'] + '.json'), result)
+            if os.path.exists(claimed_file):
+                os.remove(claimed_file)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['worker'])
+    parser.add_argument('--spool', default='spool', action='store')
+    parser.add_argument('--work_dir', action='store')
+    parser.add_argument('--lease_timeout', default=600, type=float, action='store')
+    parser.add_argument('--idle_exit', type=float, action='store')
+    args = parser.parse_args()
+
+    worker = SpoolWorker(args.spool, args.work_dir or os.path.join('temp', 'worker-' + socket.gethostname() + '-' + str(os.getpid())),
+                         lease_timeout=args.lease_timeout)
+    worker.run(idle_exit=args.idle_exit)
@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import uproot
+from utils import COUNTERS, read_csv
+
+# synthetic cmsRun: takes the arguments of a reconstruction config (python stand_in.py reconstruction.py
+# parametersFile=... nEvents=... outputFile=... timesFile=...), computes the counters of every row of cuts
+# with an analytic function and writes them in the simpleValidation{i}/output layout of SimpleValidation,
+# so that the optimizer can be run and measured end to end without CMSSW or a GPU. Tuned by environment variables:
+# STAND_IN_NOISE=1 draws the counters (binomial noise shrinking with the number of events),
+# STAND_IN_STARTUP seconds before the event loop, STAND_IN_LATENCY seconds per event and particle,
+# STAND_IN_MEMORY MB allocated per particle, STAND_IN_SEED for the noise
+NUM_INPUT_EVENTS = 1000
+
+# smooth trade-off between efficiency and fake rate as the cuts get looser,
+# paid for with a CA time that grows with the number of doublets kept
+def looseness(row):
+    row = np.asarray(row, dtype=float)
+    return (row[0] / 0.006 + row[1] / 0.03 + row[2] / 0.2 + row[3] + row[5] / 20.0
+            + np.mean(row[6:] - 400) / 600) / 6
+
+# rt, at, ast, dt, st counters and CA time per event of one row of cuts; with a generator, the associated
+# and reconstructed tracks are drawn around the same expectation
+def analytic_counters(row, num_events, rng=None):
+    x = looseness(row)
+    total_sim = 100 * num_events
+    efficiency = 0.6 + 0.2 * np.tanh(2 * x)
+    rec_per_ass = 1.02 + 0.08 * x ** 2
+    if rng is None:
+        total_ass_sim = int(total_sim * efficiency)
+        total_rec = int(total_ass_sim * rec_per_ass)
+        total_dup = int(0.01 * total_rec)
+    else:
+        total_ass_sim = int(rng.binomial(total_sim, efficiency))
+        total_rec = total_ass_sim + int(rng.poisson(total_ass_sim * (rec_per_ass - 1)))
+        total_dup = int(rng.binomial(total_rec, 0.01))
+    return [total_rec, total_ass_sim, total_ass_sim, total_dup, total_sim, 2.0 * (1 + x) ** 2]
+
+# the VarParsing-style key=value arguments after the config
+def parse_options(argv):
+    return dict(argument.split('=', 1) for argument in argv if '=' in argument)
+
+# FastTimerService-like summary: the CA time of each particle split over its three modules
+def write_times(times_file, rows, num_events):
+    modules = []
+    for i, values in enumerate(rows):
+        for label, share in (('pixelTracksCUDA', 0.8), ('pixelTracksSoA', 0.05), ('pixelTracks', 0.15)):
+            modules.append({'label': label + str(i), 'type': 'stand_in', 'events': num_events,
+                            'time_real': share * values[5] * num_events, 'time_thread': share * values[5] * num_events})
+    with open(times_file, 'w') as f:
+        json.dump({'modules': modules, 'total': {'label': 'job', 'events': num_events,
+                                                 'time_real': sum(module['time_real'] for module in modules)}}, f)
+
+def main(argv):
+    start = time.time()
+    options = parse_options(argv[1:])
+    params = read_csv(options['parametersFile']) if os.path.getsize(options['parametersFile']) else np.empty((0, 0))
+    num_events = int(options.get('nEvents', 100))
+    available = NUM_INPUT_EVENTS
+    if options.get('eventList'):
+        with open(options['eventList']) as f:
+            available = len(f.read().split())
+    num_events = available if num_events < 0 else min(num_events, available)
+    # the messages the tracer splits the stages of a cmsRun with
+    print('config built in %.3f s' % (time.time() - start))
+    ballast = b'\x01' * (int(float(os.environ.get('STAND_IN_MEMORY', 0)) * 1e6) * len(params))
+    time.sleep(float(os.environ.get('STAND_IN_STARTUP', 0)))
+    print('Begin processing the 1st record. Run 1, Event 1, LumiSection 1 on stream 0 at %s'
+          % datetime.now().strftime('%d-%b-%Y %H:%M:%S.%f'))
+    sys.stdout.flush()
+    rng = np.random.default_rng(int(os.environ['STAND_IN_SEED']) if 'STAND_IN_SEED' in os.environ else None) \
+        if os.environ.get('STAND_IN_NOISE', '0') != '0' else None
+    rows = [analytic_counters(row, num_events, rng) for row in params]
+    time.sleep(float(os.environ.get('STAND_IN_LATENCY', 0)) * num_events * len(params))
+    with uproot.recreate(options['outputFile']) as f:
+        for i, values in enumerate(rows):
+            f['simpleValidation%d/output' % i] = {name: np.array([value], dtype=np.int64)
+                                                  for name, value in zip(COUNTERS, values)}
+    if options.get('timesFile'):
+        write_times(options['timesFile'], rows, num_events)
+    del ballast
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+from utils import atomic_open, write_csv
+
+# appendable columnar store of every evaluation: one raw little-endian binary file per column
+# plus meta.json holding the dtype and row shape of each column and the number of complete rows,
+# so that any column can be memory-mapped without reading the others
+class EvaluationStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta_file = os.path.join(directory, 'meta.json')
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file) as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {'rows': 0, 'columns': {}}
+
+    def column_file(self, name):
+        return os.path.join(self.directory, name + '.bin')
+
+    def __len__(self):
+        return self.meta['rows']
+
+    # append a batch of rows; every column must have the same first dimension
+    # and, after the first append, the same set of columns
+    def append(self, **columns):
+        columns = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+        num_rows = len(next(iter(columns.values())))
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        if not self.meta['columns']:
+            self.meta['columns'] = {name: {'dtype': values.dtype.newbyteorder('<').str, 'shape': list(values.shape[1:])}
+                                    for name, values in columns.items()}
+        if set(columns) != set(self.meta['columns']):
+            raise ValueError('expected columns ' + ', '.join(sorted(self.meta['columns'])))
+        for name, values in columns.items():
+            column = self.meta['columns'][name]
+            if len(values) != num_rows or list(values.shape[1:]) != column['shape']:
+                raise ValueError('column ' + name + ' has shape ' + str(values.shape))
+            with open(self.column_file(name), 'ab') as f:
+                # drop what an interrupted append may have left after the last complete row
+                f.truncate(self.meta['rows'] * np.dtype(column['dtype']).itemsize * int(np.prod(column['shape'])))
+                f.write(values.astype(column['dtype'], copy=False).tobytes())
+        self.meta['rows'] += num_rows
+        self.write_meta()
+
+    # meta.json is replaced atomically, readers never see rows that are not fully written
+    def write_meta(self):
+        for name in self.meta['columns']:
+            with open(self.column_file(name), 'ab') as f:
+                os.fsync(f.fileno())
+        with atomic_open(self.meta_file) as f:
+            json.dump(self.meta, f, indent=4)
+
+    # memory-map the requested columns (all of them by default), read-only
+    def load(self, *names):
+        names = names or tuple(self.meta['columns'])
+        loaded = {}
+        for name in names:
+            column = self.meta['columns'][name]
+            shape = (self.meta['rows'], *column['shape'])
+            if not self.meta['rows']:
+                loaded[name] = np.empty(shape, dtype=column['dtype'])
+            else:
+                loaded[name] = np.memmap(self.column_file(name), dtype=column['dtype'], mode='r', shape=shape)
+        return loaded
+
+    # remove every row, for a fresh run
+    def reset(self):
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        self.meta = {'rows': 0, 'columns': {}}
+
+    # write the old history layout: iterationN.csv with the cuts followed by the fitness, one row per particle
+    def export_csv(self, directory):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        columns = self.load('iteration', 'particle', 'params', 'fitness')
+        for iteration in np.unique(columns['iteration']):
+            selected = np.flatnonzero(columns['iteration'] == iteration)
+            selected = selected[np.argsort(columns['particle'][selected], kind='stable')]
+            write_csv(os.path.join(directory, 'iteration' + str(iteration) + '.csv'),
+                      np.hstack([columns['params'][selected], columns['fitness'][selected]]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['export', 'info'])
+    parser.add_argument('store', nargs='?', default='history/evaluations')
+    parser.add_argument('-o', '--output', default='history', action='store')
+    args = parser.parse_args()
+
+    store = EvaluationStore(args.store)
+    if args.command == 'export':
+        store.export_csv(args.output)
+    else:
+        print(len(store), 'rows')
+        for name, column in store.meta['columns'].items():
+            print(name, column['dtype'], column['shape'])
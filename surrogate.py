@@ -0,0 +1,65 @@
+import numpy as np
+from utils import pareto_ranks
+
+# Gaussian process regression of the objectives over the (normalized) cuts,
+# used to decide which particles are worth a real evaluation
+class Surrogate:
+    def __init__(self, lower_bounds, upper_bounds, max_points=1000, noise=1e-2, num_objectives=2):
+        self.lower_bounds = np.asarray(lower_bounds, dtype=float)
+        self.upper_bounds = np.asarray(upper_bounds, dtype=float)
+        self.max_points = max_points
+        self.noise = noise
+        self.x = np.empty((0, len(lower_bounds)))
+        self.y = np.empty((0, num_objectives))
+        self.trained = False
+
+    def normalize(self, params):
+        return (np.asarray(params, dtype=float) - self.lower_bounds) / (self.upper_bounds - self.lower_bounds)
+
+    # add real evaluations to the training set
+    def add(self, params, fitness):
+        self.x = np.vstack([self.x, self.normalize(params)])
+        self.y = np.vstack([self.y, np.asarray(fitness, dtype=float)])
+
+    def kernel(self, a, b):
+        distances = np.sum(a ** 2, axis=1)[:, None] + np.sum(b ** 2, axis=1)[None, :] - 2 * a @ b.T
+        return np.exp(-0.5 * np.maximum(distances, 0) / self.length_scale ** 2)
+
+    # refit on the most recent max_points evaluations
+    def fit(self):
+        x, y = self.x[-self.max_points:], self.y[-self.max_points:]
+        if len(x) < 2:
+            return
+        # median heuristic for the length scale
+        distances = np.sqrt(np.maximum(np.sum(x ** 2, axis=1)[:, None] + np.sum(x ** 2, axis=1)[None, :]
+                                       - 2 * x @ x.T, 0))
+        self.length_scale = max(np.median(distances[np.triu_indices(len(x), 1)]), 1e-3)
+        self.y_mean = y.mean(axis=0)
+        self.y_std = np.maximum(y.std(axis=0), 1e-9)
+        self.train_x = x
+        covariance = self.kernel(x, x) + self.noise * np.eye(len(x))
+        self.cholesky = np.linalg.cholesky(covariance)
+        self.alpha = np.linalg.solve(self.cholesky.T, np.linalg.solve(self.cholesky, (y - self.y_mean) / self.y_std))
+        self.trained = True
+
+    # predicted mean and standard deviation of the objectives
+    def predict(self, params):
+        cross = self.kernel(self.normalize(params), self.train_x)
+        mean = cross @ self.alpha * self.y_std + self.y_mean
+        v = np.linalg.solve(self.cholesky, cross.T)
+        variance = np.maximum(1 + self.noise - np.sum(v ** 2, axis=0), 0)
+        return mean, np.sqrt(variance)[:, None] * self.y_std
+
+    # choose the rows to evaluate for real: half of them the most promising by
+    # optimistic non-dominated rank, the other half the most uncertain
+    def screen(self, params, fraction, kappa=1.0):
+        mean, std = self.predict(params)
+        num_real = max(1, int(np.ceil(fraction * len(params))))
+        ranks = pareto_ranks(mean - kappa * std)
+        chosen = list(np.argsort(ranks, kind='stable')[:(num_real + 1) // 2])
+        for i in np.argsort(-np.sum(std / self.y_std, axis=1), kind='stable'):
+            if len(chosen) >= num_real:
+                break
+            if i not in chosen:
+                chosen.append(i)
+        return np.sort(chosen), mean, std
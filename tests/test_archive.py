@@ -0,0 +1,48 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import ParetoArchive
+from utils import pareto_ranks
+
+def test_front():
+    fitness = np.random.rand(300, 2)
+    archive = ParetoArchive()
+    archive.insert_many(np.arange(300)[:, None], fitness)
+    assert sorted(np.array(archive.positions)[:, 0]) == sorted(np.flatnonzero(pareto_ranks(fitness) == 0))
+    # sorted by the first objective, the second one then strictly decreasing
+    front = np.array(archive.fitness)
+    assert np.all(np.diff(front[:, 0]) > 0) and np.all(np.diff(front[:, 1]) < 0)
+
+# with max_size, the most crowded interior points are dropped and both ends are kept
+def test_max_size():
+    x = np.concatenate([np.linspace(0, 0.1, 20), np.linspace(0.2, 1, 5)])
+    archive = ParetoArchive(max_size=10)
+    archive.insert_many(x[:, None], np.column_stack([x, 1 - x]))
+    assert len(archive) == 10
+    front = np.array(archive.fitness)
+    assert front[0, 0] == 0 and front[-1, 0] == 1
+    # the sparse part of the front is kept whole
+    assert np.sum(front[:, 0] >= 0.2) == 5
+
+# with epsilon, each box of the grid keeps one point
+def test_epsilon():
+    x = np.linspace(0, 1, 101)
+    archive = ParetoArchive(epsilon=0.1)
+    archive.insert_many(x[:, None], np.column_stack([x, 1 - x]))
+    keys = [archive.key(values) for values in archive.fitness]
+    assert len(keys) == len(set(keys)) and len(archive) <= 11
+
+# a front with the CA time after the two objectives: the objectives follow the cuts, whatever comes after them
+def test_merge_by_number_of_cuts():
+    front = np.array([[1.0, 2.0, 0.1, 0.5, 9.0],
+                      [3.0, 4.0, 0.5, 0.1, 1.0],
+                      [5.0, 6.0, 0.6, 0.6, 0.1]])
+    archive = ParetoArchive()
+    archive.merge(front, 2)
+    assert np.array_equal(archive.to_matrix(), front[:2, :4])
+    with pytest.raises(ValueError):
+        archive.merge(front, 4)
@@ -0,0 +1,33 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fidelity import fidelity_budgets, front_distances, successive_halving
+
+def test_budgets():
+    assert fidelity_budgets(90, 3, 3) == [10, 30, 90]
+    assert fidelity_budgets(5, 4, 3) == [1, 1, 1, 5]
+
+def test_front_distances():
+    front = np.array([[0.2, 0.2], [0.04, 0.5]])
+    # dominated by the first point, beyond the front, and dominated by the second point
+    distances = front_distances([[0.3, 0.25], [0.1, 0.1], [0.05, 0.9]], front)
+    assert np.allclose(distances, [0.05, -0.1, 0.01])
+
+# the first and the last rows are non-dominated in the batch: the batch ranks promote the first one, the front the
+# one closest to it
+def test_promotion_against_front():
+    fitness = {0: [0.05, 0.95], 1: [0.9, 0.3], 2: [0.205, 0.205]}
+    evaluated = []
+    def evaluate(rows, num_events):
+        evaluated.append((num_events, [row[0] for row in rows]))
+        return [fitness[row[0]] for row in rows]
+    rows = [[0], [1], [2]]
+    _, levels = successive_halving(rows, evaluate, [10, 30], 3)
+    assert list(levels) == [1, 0, 0]
+    evaluated.clear()
+    _, levels = successive_halving(rows, evaluate, [10, 30], 3, front=np.array([[0.2, 0.2], [0.04, 0.5]]))
+    assert list(levels) == [0, 0, 1]
+    assert evaluated == [(10, [0, 1, 2]), (30, [2])]
@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from executor import PENALTY, EvaluationError
+from search_space import space
+from spool import SpoolExecutor
+from stand_in import analytic_counters
+
+# three local workers on a spool in a temporary directory, with the analytic stand-in as backend
+@pytest.fixture
+def spool_dir(tmp_path):
+    spool_dir = str(tmp_path / 'spool')
+    workers = [subprocess.Popen([sys.executable, 'spool.py', 'worker', '--spool', spool_dir, '--lease_timeout', '2',
+                                 '--idle_exit', '60', '--work_dir', str(tmp_path / ('worker%d' % i))],
+                                cwd=REPO, stdout=subprocess.DEVNULL)
+               for i in range(3)]
+    yield spool_dir
+    for worker in workers:
+        worker.terminate()
+        worker.wait()
+
+def executor(spool_dir, num_shards=3):
+    return SpoolExecutor(spool_dir, 'reconstruction.py', 'input/step2.root', 10, num_shards=num_shards,
+                         backend='stub', lease_timeout=2, poll_interval=0.05)
+
+def rows(num_rows):
+    defaults = np.array(space(1).defaults)
+    return np.array([defaults * (1 + 0.1 * i) for i in range(num_rows)])
+
+def spool_files(spool_dir):
+    return [name for subdirectory in ('pending', 'claimed', 'done') for name in os.listdir(os.path.join(spool_dir, subdirectory))]
+
+# the counters of the shards come back in the order of the rows, whichever worker finishes first
+def test_submission_order(spool_dir):
+    params = rows(7)
+    counters = executor(spool_dir).evaluate(params)
+    assert np.allclose(counters, [analytic_counters(row, 10) for row in params])
+    assert not spool_files(spool_dir)
+
+# a claim left behind by a dead worker is requeued once its lease expires, and run by another worker
+def test_expired_lease(spool_dir):
+    spool = executor(spool_dir)
+    params = rows(2)
+    start = time.time()
+    id = spool.submit(params, 10)
+    claimed_file = os.path.join(spool_dir, 'claimed', id + '.json')
+    os.rename(os.path.join(spool_dir, 'pending', id + '.json'), claimed_file)
+    os.utime(claimed_file, (start - 60, start - 60))
+    counters = None
+    while counters is None and time.time() - start < 30:
+        time.sleep(0.05)
+        counters = spool.collect(id, start)
+    assert np.allclose(counters, [analytic_counters(row, 10) for row in params])
+
+# a row that makes its job fail is isolated and quarantined, the other rows keep their counters
+def test_job_error_isolated(spool_dir):
+    params = rows(4)
+    params[1] = np.nan
+    spool = executor(spool_dir, num_shards=2)
+    counters = spool.evaluate(params)
+    assert list(counters[1]) == PENALTY
+    assert np.allclose([counters[i] for i in (0, 2, 3)], [analytic_counters(params[i], 10) for i in (0, 2, 3)])
+    assert len(spool.quarantine) == 1
+
+# a batch in which every job fails raises, and leaves no job of the batch in the spool
+def test_job_error_raises(spool_dir):
+    params = np.full((6, len(space(1))), np.nan)
+    with pytest.raises(EvaluationError):
+        executor(spool_dir).evaluate(params)
+    time.sleep(1)
+    assert not spool_files(spool_dir)
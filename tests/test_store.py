@@ -0,0 +1,55 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import EvaluationStore
+from utils import read_csv
+
+def batch(iteration, num_rows):
+    return dict(iteration=np.full(num_rows, iteration, dtype=np.int32), particle=np.arange(num_rows, dtype=np.int32)[::-1],
+                params=np.random.rand(num_rows, 3), fitness=np.random.rand(num_rows, 2))
+
+def test_round_trip(tmp_path):
+    directory = str(tmp_path / 'evaluations')
+    first, second = batch(0, 4), batch(1, 3)
+    store = EvaluationStore(directory)
+    store.append(**first)
+    store.append(**second)
+
+    # read back by a new store, from meta.json and the column files only
+    store = EvaluationStore(directory)
+    assert len(store) == 7
+    columns = store.load()
+    for name in first:
+        assert np.array_equal(columns[name], np.concatenate([first[name], second[name]]))
+    assert list(store.load('fitness')) == ['fitness']
+
+    with pytest.raises(ValueError):
+        store.append(iteration=np.zeros(1, dtype=np.int32))
+    with pytest.raises(ValueError):
+        store.append(**dict(batch(2, 2), params=np.zeros((2, 4))))
+
+    # one file per iteration, in particle order
+    store.export_csv(str(tmp_path / 'csv'))
+    exported = read_csv(str(tmp_path / 'csv' / 'iteration1.csv'))
+    assert np.allclose(exported, np.hstack([second['params'], second['fitness']])[::-1])
+
+    store.reset()
+    assert len(store) == 0 and not os.path.exists(directory)
+
+# an append interrupted after some column files were written: the bytes past the last complete row are dropped
+def test_interrupted_append(tmp_path):
+    directory = str(tmp_path / 'evaluations')
+    first = batch(0, 2)
+    store = EvaluationStore(directory)
+    store.append(**first)
+    with open(store.column_file('params'), 'ab') as f:
+        f.write(b'\0' * 13)
+
+    store = EvaluationStore(directory)
+    second = batch(1, 2)
+    store.append(**second)
+    assert np.array_equal(store.load('params')['params'], np.vstack([first['params'], second['params']]))
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+pytest.importorskip('optimizer.mopso')
+
+from archive import ParetoArchive
+from benchmark import prepare
+from store import EvaluationStore
+from utils import read_csv
+
+# with the surrogate and a single fidelity level, the particles evaluated for real keep the full fidelity
+# in every iteration, and the archive holds the front of all of them
+def test_surrogate_single_budget(tmp_path):
+    work_dir = str(tmp_path / 'run')
+    prepare(work_dir)
+    env = dict(os.environ, PATH=os.path.join(work_dir, 'bin') + os.pathsep + os.environ['PATH'])
+    subprocess.run([sys.executable, 'optimize.py', '-p', '10', '-i', '4', '-e', '10', '--surrogate', '0.5',
+                    '--no_cache'], cwd=work_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    columns = EvaluationStore(os.path.join(work_dir, 'history', 'evaluations')).load()
+    real = columns['predicted'] == 0
+    assert (columns['iteration'][real] > 0).any()
+    assert np.all(columns['fidelity'][real] == 0)
+    assert np.all(columns['num_events'][real] == 10)
+    assert np.all(columns['fidelity'][~real] == -1)
+
+    expected = ParetoArchive()
+    expected.insert_many(columns['params'][real], columns['fitness'][real, :2])
+    archived = read_csv(os.path.join(work_dir, 'checkpoint', 'archive.csv'))
+    assert sorted(map(tuple, archived)) == sorted(map(tuple, expected.to_matrix()))
@@ -0,0 +1,20 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from executor import PENALTY
+from utils import compute_metrics, compute_metrics_batch
+
+# the batch metrics match the ones of each row, penalized and empty rows included, with or without a time column
+def test_compute_metrics_batch():
+    counters = np.random.randint(1, 1000, (20, 5)).astype(float)
+    counters[3, 0] = 0
+    counters[7, 4] = 0
+    rows = np.vstack([counters, np.array(PENALTY)[:5]])
+    expected = [compute_metrics(row) for row in rows]
+    assert np.allclose(compute_metrics_batch(rows), expected)
+    timed = np.column_stack([rows, np.random.rand(len(rows))])
+    assert np.allclose(compute_metrics_batch(timed), expected)
+    assert np.array_equal(compute_metrics_batch(rows)[[3, 7, 20]], np.ones((3, 2)))
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from benchmark import prepare
+from store import EvaluationStore
+from timing import read_trace
+from wal import EvaluationLog
+
+def test_log_round_trip(tmp_path):
+    filename = str(tmp_path / 'history' / 'wal.jsonl')
+    log = EvaluationLog(filename)
+    log.append(3, [0, 1], [[1.0, 2.0], [3.0, 4.0]], [[10, 9, 9, 0, 12, 1.5], [11, 8, 8, 0, 12, 2.5]], 100)
+    log.close()
+    # the last line of a run killed while appending
+    with open(filename, 'a') as f:
+        f.write('{"iteration": 3, "parti')
+
+    log = EvaluationLog(filename)
+    assert len(log) == 2
+    assert log.get(3, 1, [3.0, 4.0], 100) == [11, 8, 8, 0, 12, 2.5]
+    # other cuts, another number of events or another iteration: not the same evaluation
+    assert log.get(3, 1, [3.0, 4.5], 100) is None
+    assert log.get(3, 1, [3.0, 4.0], 50) is None
+    assert log.get(4, 1, [3.0, 4.0], 100) is None
+
+    log.truncate(4)
+    assert len(log) == 0
+    assert len(EvaluationLog(filename)) == 0
+
+def optimize(work_dir, *arguments):
+    env = dict(os.environ, PATH=os.path.join(work_dir, 'bin') + os.pathsep + os.environ['PATH'])
+    return subprocess.run([sys.executable, 'optimize.py', '-p', '8', '-e', '10', '-s', '2', '--seed', '3', '--no_cache',
+                           *arguments], cwd=work_dir, env=env, check=True, capture_output=True, text=True).stdout
+
+# a continued run killed after the first shard of its iteration: the resumed run takes that shard from the
+# write-ahead log, runs only the other one and ends with the same history as a run that was not killed
+def test_resume_from_log(tmp_path):
+    pytest.importorskip('optimizer.mopso')
+    work_dir = str(tmp_path / 'run')
+    resumed_dir = str(tmp_path / 'resumed')
+    prepare(work_dir)
+    optimize(work_dir, '-i', '1')
+    shutil.copytree(work_dir, resumed_dir, symlinks=True)
+    optimize(work_dir, '-c', '1')
+
+    with open(os.path.join(work_dir, 'history', 'wal.jsonl')) as f:
+        entries = [json.loads(line) for line in f]
+    assert sorted(entry['particle'] for entry in entries) == list(range(8))
+    with open(os.path.join(resumed_dir, 'history', 'wal.jsonl'), 'w') as f:
+        for entry in entries:
+            if entry['particle'] < 4:
+                f.write(json.dumps(entry) + '\n')
+    output = optimize(resumed_dir, '-c', '1')
+
+    assert 'write-ahead log: 4 of 8 rows already evaluated in this iteration' in output
+    iteration = entries[0]['iteration']
+    evaluated = [record['rows'] for record in read_trace(os.path.join(resumed_dir, 'history', 'trace.jsonl'))
+                 if record['stage'] == 'evaluate' and record.get('iteration') == iteration]
+    assert evaluated == [4]
+    expected = EvaluationStore(os.path.join(work_dir, 'history', 'evaluations')).load()
+    columns = EvaluationStore(os.path.join(resumed_dir, 'history', 'evaluations')).load()
+    for name in ('iteration', 'particle', 'params', 'fitness'):
+        assert np.array_equal(columns[name], expected[name])
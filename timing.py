@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+
+# JSON-lines trace of where the wall clock goes: one line per stage with its name, start time,
+# duration in seconds and context (iteration, shard, ...). Without a filename nothing is written.
+class Tracer:
+    def __init__(self, filename=None):
+        self.file = None
+        self.context = {}
+        if filename:
+            directory = os.path.dirname(filename)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            # line buffered: one write per record, and the trace survives a crash
+            self.file = open(filename, 'a', buffering=1)
+
+    def record(self, stage, start, seconds, **fields):
+        if self.file is None:
+            return
+        self.file.write(json.dumps({'stage': stage, 'start': round(start, 6), 'seconds': round(seconds, 6),
+                                    **self.context, **fields}) + '\n')
+
+    @contextmanager
+    def stage(self, name, **fields):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.time() - start, **fields)
+
+    # the stages of a finished cmsRun, started at start and seen finished at end
+    def cmsrun(self, log_file, start, end, **fields):
+        if self.file is None:
+            return
+        self.record('cmsrun', start, end - start, **fields)
+        for name, (stage_start, seconds) in cmsrun_stages(log_file, start, end).items():
+            self.record(name, stage_start, seconds, **fields)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# printed by the reconstruction configs once the process is built
+CONFIG_LINE = re.compile(r'config built in ([0-9.]+) s')
+# printed by the MessageLogger when the event loop starts
+FIRST_RECORD = re.compile(r'Begin processing the 1st record\..* at (\d{2}-\w{3}-\d{4} \d{2}:\d{2}:\d{2}\.\d+)')
+
+# split the wall time of a cmsRun into config building, framework startup (modules, conditions,
+# input file) and event loop, from its log; stages that cannot be found in the log are left out
+def cmsrun_stages(log_file, start, end):
+    config_seconds = None
+    first_record = None
+    if os.path.exists(log_file):
+        with open(log_file, errors='replace') as f:
+            for line in f:
+                match = CONFIG_LINE.search(line)
+                if match and config_seconds is None:
+                    config_seconds = float(match.group(1))
+                match = FIRST_RECORD.search(line)
+                if match:
+                    # local time of the node, like time.time() here
+                    first_record = datetime.strptime(match.group(1), '%d-%b-%Y %H:%M:%S.%f').timestamp()
+                    break
+    stages = {}
+    startup_start = start
+    if config_seconds is not None:
+        stages['config'] = (start, config_seconds)
+        startup_start = start + config_seconds
+    if first_record is not None and startup_start <= first_record <= end:
+        stages['startup'] = (startup_start, first_record - startup_start)
+        stages['event_loop'] = (first_record, end - first_record)
+    return stages
+
+# read the records of a trace
+def read_trace(filename):
+    records = []
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+# per-stage count, total, share of the traced wall clock and percentiles of the durations
+def summarize(records):
+    if not records:
+        return 'empty trace'
+    wall = max(record['start'] + record['seconds'] for record in records) - min(record['start'] for record in records)
+    stages = {}
+    for record in records:
+        stages.setdefault(record['stage'], []).append(record['seconds'])
+    lines = ['traced wall clock: %.1f s (stages of concurrent shards overlap, shares can add up to more than 100%%)' % wall,
+             '%-18s %7s %10s %7s %9s %9s %9s %9s' % ('stage', 'count', 'total [s]', 'share', 'mean', 'p50', 'p90', 'p99')]
+    for stage, seconds in sorted(stages.items(), key=lambda item: -sum(item[1])):
+        seconds = np.array(seconds)
+        p50, p90, p99 = np.percentile(seconds, [50, 90, 99])
+        lines.append('%-18s %7d %10.2f %6.1f%% %9.4f %9.4f %9.4f %9.4f'
+                     % (stage, len(seconds), seconds.sum(), 100 * seconds.sum() / max(wall, 1e-9),
+                        seconds.mean(), p50, p90, p99))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['summary'])
+    parser.add_argument('trace', nargs='?', default='history/trace.jsonl')
+    parser.add_argument('--iteration', type=int, action='store')
+    args = parser.parse_args()
+
+    records = read_trace(args.trace)
+    if args.iteration is not None:
+        records = [record for record in records if record.get('iteration') == args.iteration]
+    print(summarize(records))
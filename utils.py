@@ -1,26 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import json
+import os
+import re
 import numpy as np
 
-# calculate the metrics from validation results
-def get_metrics(uproot_file, id):
+# names of the counters written by SimpleValidation
+COUNTERS = ['rt', 'at', 'ast', 'dt', 'st']
+
+# read the counters of one particle from validation results
+def get_counters(uproot_file, id):
     tree = uproot_file['simpleValidation' + str(id)]['output']
-    total_rec = tree['rt'].array()[0]
-    total_ass = tree['at'].array()[0]
-    total_ass_sim = tree['ast'].array()[0]
-    total_dup = tree['dt'].array()[0]
-    total_sim = tree['st'].array()[0]
-    
+    return [tree[name].array()[0] for name in COUNTERS]
+
+# read the counters of many particles in one pass over the file, as an (N, 5) array in the order of ids
+# (all simpleValidation directories found when ids is None); num_workers > 1 decompresses in parallel
+def get_counters_batch(uproot_file, ids=None, num_workers=1):
+    directories = {}
+    for key in uproot_file.keys(recursive=False, cycle=False):
+        if key.startswith('simpleValidation'):
+            directories[int(key[len('simpleValidation'):])] = key
+    if ids is None:
+        ids = sorted(directories)
+    executor = ThreadPoolExecutor(num_workers) if num_workers > 1 else None
+    try:
+        counters = np.empty((len(ids), len(COUNTERS)))
+        for row, id in enumerate(ids):
+            arrays = uproot_file[directories[id] + '/output'].arrays(COUNTERS, library='np',
+                                                                     decompression_executor=executor)
+            counters[row] = [arrays[name][0] for name in COUNTERS]
+        return counters
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+# labels of the modules of one particle in the FastTimerService summary, whose times add up to its CA time
+CA_MODULES = re.compile(r'^(pixelTracksCUDA|pixelTracksSoA|pixelTracks)(\d+)$')
+
+# real time per event in ms spent in the CA modules of each particle, from the FastTimerService
+# JSON summary, as an (N,) array (NaN for every particle when the summary is missing)
+def get_times(times_file, num_particles):
+    times = np.full(num_particles, np.nan)
+    if not os.path.exists(times_file):
+        return times
+    with open(times_file) as f:
+        summary = json.load(f)
+    times[:] = 0
+    for module in summary['modules']:
+        match = CA_MODULES.match(module['label'])
+        if match and int(match.group(2)) < num_particles and module['events']:
+            times[int(match.group(2))] += module['time_real'] / module['events']
+    return times
+
+# split rows of counters, optionally followed by the CA time, into an (N, 5) array of counters
+# and an (N,) array of times (NaN when the rows have none)
+def split_times(rows):
+    rows = np.asarray(rows, dtype=float)
+    if not rows.size:
+        return np.empty((0, len(COUNTERS))), np.empty(0)
+    rows = rows.reshape(-1, rows.shape[-1])
+    times = rows[:, len(COUNTERS)] if rows.shape[1] > len(COUNTERS) else np.full(len(rows), np.nan)
+    return rows[:, :len(COUNTERS)], times
+
+# calculate the metrics from the counters of one particle
+def compute_metrics(counters):
+    total_rec, total_ass, total_ass_sim, total_dup, total_sim = counters[:len(COUNTERS)]
+
     if not total_ass or not total_rec or not total_sim or not total_ass_sim:
         return [1.0] * 2
-    
+
     return [1 - total_ass_sim / total_sim, (total_rec - total_ass + total_dup) / total_rec]
 
+# calculate the metrics of an (N, 5) array of counters (a time column is ignored), with the same zero guard as compute_metrics
+def compute_metrics_batch(counters):
+    total_rec, total_ass, total_ass_sim, total_dup, total_sim = split_times(counters)[0].T
+    valid = (total_ass != 0) & (total_rec != 0) & (total_sim != 0) & (total_ass_sim != 0)
+    fitness = np.ones((len(valid), 2))
+    fitness[valid, 0] = 1 - total_ass_sim[valid] / total_sim[valid]
+    fitness[valid, 1] = (total_rec[valid] - total_ass[valid] + total_dup[valid]) / total_rec[valid]
+    return fitness
+
+# calculate the metrics from validation results
+def get_metrics(uproot_file, id):
+    return compute_metrics(get_counters(uproot_file, id))
+
+# non-dominated rank of each row of a fitness matrix to be minimized, 0 for the pareto front
+def pareto_ranks(fitness):
+    fitness = np.asarray(fitness, dtype=float)
+    # dominated_by[i, j] is True when row j dominates row i
+    dominated_by = (np.all(fitness[None, :] <= fitness[:, None], axis=2)
+                    & np.any(fitness[None, :] < fitness[:, None], axis=2))
+    ranks = np.full(len(fitness), -1)
+    rank = 0
+    remaining = np.ones(len(fitness), dtype=bool)
+    while remaining.any():
+        front = remaining & ~(dominated_by & remaining).any(axis=1)
+        ranks[front] = rank
+        remaining &= ~front
+        rank += 1
+    return ranks
+
+# the cuts as seen by the reconstruction configs: the csv round trip, then int() for the integer cuts of the space
+def effective_params(row, search_space):
+    row = [float('%.18f' % value) for value in row]
+    return [int(value) if dimension.type == 'int' else value for value, dimension in zip(row, search_space.dimensions)]
+
 # read a csv file, return a matrix
 def read_csv(filename):
     matrix = np.genfromtxt(filename, delimiter=",", dtype=float)
     if matrix.ndim == 2:
-        return np.genfromtxt(filename, delimiter=",", dtype=float)
+        return matrix
     return np.array([matrix])
-    
+
+# replace a file atomically: write a temporary file next to it, fsync it and rename it over the old one,
+# so that a run killed at any moment leaves either the old or the new content
+@contextmanager
+def atomic_open(filename, mode='w'):
+    temp_file = '%s.tmp%d' % (filename, os.getpid())
+    try:
+        with open(temp_file, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, filename)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
 # write a matrix to a csv file
 def write_csv(filename, matrix):
-    np.savetxt(filename, matrix, fmt='%.18f', delimiter=',')
+    with atomic_open(filename) as f:
+        np.savetxt(f, matrix, fmt='%.18f', delimiter=',')
@@ -0,0 +1,65 @@
+import json
+import os
+from utils import atomic_open
+
+# write-ahead log of the evaluations of a run: the counters of every finished batch are appended as one JSON line
+# per particle, keyed by iteration, particle and number of events, and fsynced before the run goes on; a run killed
+# in the middle of an iteration is continued (-c) by taking back from the log the particles it had evaluated
+class EvaluationLog:
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        if os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line of a run killed while appending
+                        continue
+                    self.entries[entry['iteration'], entry['particle'], entry['num_events']] = entry
+        self.file = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    # the counters logged for a particle, if it was evaluated with the same cuts
+    def get(self, iteration, particle, row, num_events):
+        entry = self.entries.get((iteration, particle, num_events))
+        if entry is None or entry['params'] != [float(value) for value in row]:
+            return None
+        return entry['counters']
+
+    # log the counters of the particles of a batch, with the cuts they were evaluated with
+    def append(self, iteration, particles, rows, counters, num_events):
+        if not particles:
+            return
+        if self.file is None:
+            directory = os.path.dirname(self.filename)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self.file = open(self.filename, 'a')
+        lines = []
+        for particle, row, values in zip(particles, rows, counters):
+            entry = {'iteration': int(iteration), 'particle': int(particle), 'num_events': int(num_events),
+                     'params': [float(value) for value in row], 'counters': [float(value) for value in values]}
+            self.entries[entry['iteration'], entry['particle'], entry['num_events']] = entry
+            lines.append(json.dumps(entry) + '\n')
+        self.file.write(''.join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    # drop the entries of the iterations before this one, which are in the history store by then
+    def truncate(self, iteration):
+        if all(key[0] >= iteration for key in self.entries):
+            return
+        self.entries = {key: entry for key, entry in self.entries.items() if key[0] >= iteration}
+        self.close()
+        with atomic_open(self.filename) as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + '\n')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
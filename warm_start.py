@@ -0,0 +1,62 @@
+import argparse
+import os
+import numpy as np
+from archive import ParetoArchive
+from search_space import SearchSpace, space
+from store import EvaluationStore
+from utils import read_csv, write_csv
+
+# the cuts of a front file: archive.csv and pareto_front_cuts.csv hold cuts, the pareto_front.csv of a run
+# with a search_space.json next to it holds MOPSO's coordinates and is converted with that space
+def front_rows(filename):
+    front = read_csv(filename)
+    space_file = os.path.join(os.path.dirname(filename), 'search_space.json')
+    if os.path.basename(filename) == 'pareto_front.csv' and os.path.exists(space_file):
+        source_space = SearchSpace.load(space_file)
+        num_free = len(source_space.free)
+        return np.hstack([source_space.to_params(front[:, :num_free]), front[:, num_free:]])
+    return front
+
+# the non-dominated cuts (efficiency and fake rate) of earlier studies: front files and history stores
+# (the folder of an EvaluationStore, where only the real evaluations are taken)
+def read_seeds(sources, num_params):
+    archive = ParetoArchive()
+    for source in sources:
+        if os.path.isdir(source):
+            columns = EvaluationStore(source).load('params', 'fitness', 'predicted')
+            real = (columns['predicted'] == 0) & np.all(np.isfinite(columns['fitness'][:, :2]), axis=1)
+            params, fitness = columns['params'][real], columns['fitness'][real, :2]
+        else:
+            front = front_rows(source)
+            params, fitness = front[:, :num_params], front[:, num_params:num_params + 2]
+        if params.shape[1] != num_params:
+            raise ValueError(source + ' has %d cuts, expected %d' % (params.shape[1], num_params))
+        archive.insert_many(params, fitness)
+    return np.array(archive.positions).reshape(-1, num_params)
+
+# initial positions of the swarm in the coordinates of the search space: up to fraction of the particles
+# on seeds evenly spaced along the old front (both ends included), the others sampled around random seeds
+# with a normal spread of the given fraction of each range
+def initial_positions(seeds, search_space, num_particles, fraction=0.5, spread=0.1):
+    lower_bounds, upper_bounds = np.asarray(search_space.lower_bounds), np.asarray(search_space.upper_bounds)
+    seeds = np.clip(search_space.from_params(seeds), lower_bounds, upper_bounds)
+    num_seeds = min(len(seeds), int(fraction * num_particles))
+    # no seed, or a fraction too small for one particle: the usual random swarm
+    if not num_seeds:
+        return np.random.uniform(lower_bounds, upper_bounds, (num_particles, len(lower_bounds)))
+    seeds = seeds[np.unique(np.linspace(0, len(seeds) - 1, num_seeds).round().astype(int))]
+    around = seeds[np.random.randint(len(seeds), size=num_particles - len(seeds))]
+    around = around + np.random.normal(0, spread, around.shape) * (upper_bounds - lower_bounds)
+    return np.vstack([seeds, np.clip(around, lower_bounds, upper_bounds)])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sources', nargs='+')
+    parser.add_argument('-p2', '--phase2', action='store_true')
+    parser.add_argument('-o', '--output', required=True, action='store')
+    args = parser.parse_args()
+
+    # the merged seeds in cuts, e.g. to look at them before a run
+    seeds = read_seeds(args.sources, len(space(2 if args.phase2 else 1)))
+    print(len(seeds), 'seeds on the merged front')
+    write_csv(args.output, seeds)